@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+archive_index.py - Find files that exist both inside ZIP archives and elsewhere
+
+"Organize Archive Files" moves thousands of zips into Organized/Archives/, and
+many of them are repacks of files that already exist loose somewhere in the
+tree. This script reads only the central directory of every ZIP archive (name,
+size and CRC32 of each member, found by seeking to the end of the file) without
+decompressing anything, and indexes the members by (size, CRC32). A CRC32 is
+then computed only for loose files whose size matches an archive member, so
+archive-vs-loose and archive-vs-archive duplicates are found in one pass.
+
+A matching size and CRC32 is a strong hint, not a proof: check the reported
+files before deleting anything. RAR, 7z and split archives have no central
+directory that can be read this way and are not indexed.
+
+Usage:
+    # Report duplicates between archives and loose files
+    python archive_index.py /path/to/files
+
+    # Write every duplicate group as JSON lines
+    python archive_index.py /path/to/files --out archive-duplicates.jsonl
+
+    # Take the file list from an inventory
+    python archive_index.py /path/to/files --inventory files.inventory
+"""
+
+import os
+import sys
+import json
+import zlib
+import zipfile
+import argparse
+import logging
+from collections import defaultdict
+
+from io_scheduler import DEFAULT_MAX_WORKERS, add_io_arguments, scheduler_from_args
+
+# Constants
+ZIP_EXTENSIONS = {'zip', 'cbz', 'jar'}
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_MIN_SIZE = 1024
+# Rough size of a central directory read, for the I/O budget
+CENTRAL_DIRECTORY_BYTES = 64 * 1024
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Report duplicates between ZIP archive members and loose files',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('locations', nargs='+', help='Directories to index')
+    parser.add_argument('--out', '-o', help='Write the duplicate groups to this JSON lines file')
+    parser.add_argument('--min-size', type=int, default=DEFAULT_MIN_SIZE,
+                        help=f'Ignore files and members smaller than this many bytes (default: {DEFAULT_MIN_SIZE})')
+    parser.add_argument('--inventory', '-i',
+                        help='Inventory written by inventory.py to take the files from')
+    parser.add_argument('--workers', '-w', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f'Maximum number of concurrent reads (default: {DEFAULT_MAX_WORKERS})')
+    parser.add_argument('--top', type=int, default=20,
+                        help='Number of archives and groups to list in the report (default: 20)')
+    add_io_arguments(parser)
+    return parser.parse_args()
+
+
+def list_files(locations, inventory_path=None):
+    """Return [(path, size)] of all regular files below the locations"""
+    files = []
+    if inventory_path:
+        from inventory import Inventory
+        inventory = Inventory.load(inventory_path)
+        for location in locations:
+            files.extend((path, size) for path, size, _, _, _ in inventory.rows(directory=location))
+        return files
+
+    for location in locations:
+        for root, _, names in os.walk(location):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.isfile(path) and not os.path.islink(path):
+                        files.append((path, os.path.getsize(path)))
+                except OSError:
+                    continue
+    return files
+
+
+def read_central_directory(archive_path):
+    """
+    Return [(member name, size, crc32)] from a ZIP archive's central directory.
+    zipfile seeks to the end of central directory record and reads only the
+    directory; no member is decompressed.
+    """
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            return [(info.filename, info.file_size, info.CRC) for info in archive.infolist()
+                    if not info.is_dir()]
+    except (zipfile.BadZipFile, OSError, ValueError) as e:
+        logger.warning(f"Could not read the central directory of {archive_path}: {e}")
+        return []
+
+
+def crc32_file(path):
+    """CRC32 of a file's content, as stored in ZIP central directories"""
+    crc = 0
+    try:
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+    except OSError as e:
+        logger.warning(f"Could not read {path}: {e}")
+        return None
+    return crc
+
+
+def build_index(files, scheduler, min_size=DEFAULT_MIN_SIZE):
+    """
+    Index archive members and matching loose files by (size, crc32).
+    Returns ({(size, crc32): {'archives': [(archive, member)], 'loose': [path]}},
+    {archive: member count}).
+    """
+    archives = [path for path, _ in files if os.path.splitext(path)[1][1:].lower() in ZIP_EXTENSIONS]
+    index = defaultdict(lambda: {'archives': [], 'loose': []})
+    member_counts = {}
+
+    directories = scheduler.map(read_central_directory, archives, nbytes=lambda path: CENTRAL_DIRECTORY_BYTES)
+    for archive, members in zip(archives, directories):
+        member_counts[archive] = 0
+        for name, size, crc in members:
+            if size < min_size:
+                continue
+            member_counts[archive] += 1
+            index[(size, crc)]['archives'].append((archive, name))
+    logger.info(f"Read the central directories of {len(archives)} archives "
+                f"({sum(member_counts.values())} members)")
+
+    # Only loose files with the size of some member need their CRC
+    member_sizes = {size for size, _ in index}
+    archive_set = set(archives)
+    candidates = [(path, size) for path, size in files
+                  if size in member_sizes and path not in archive_set]
+    logger.info(f"Computing CRC32 of {len(candidates)} of {len(files) - len(archives)} loose files "
+                f"({sum(size for _, size in candidates) / 1e6:.1f} MB)")
+    sizes = dict(candidates)
+    crcs = scheduler.map(crc32_file, [path for path, _ in candidates], nbytes=sizes.get)
+    for (path, size), crc in zip(candidates, crcs):
+        if crc is not None and (size, crc) in index:
+            index[(size, crc)]['loose'].append(path)
+
+    return index, member_counts
+
+
+def find_duplicates(index):
+    """Return the duplicate groups: entries seen at least twice, at least once in an archive"""
+    groups = []
+    for (size, crc), entry in index.items():
+        if len(entry['archives']) + len(entry['loose']) > 1:
+            groups.append({
+                'size': size,
+                'crc32': f"{crc:08x}",
+                'archives': [{'archive': archive, 'member': member} for archive, member in entry['archives']],
+                'loose': entry['loose'],
+            })
+    groups.sort(key=lambda group: -group['size'] * (len(group['archives']) + len(group['loose']) - 1))
+    return groups
+
+
+def archive_coverage(groups, member_counts):
+    """Return {archive: (members with a copy elsewhere, members)}"""
+    covered = defaultdict(set)
+    for group in groups:
+        for item in group['archives']:
+            covered[item['archive']].add(item['member'])
+    return {archive: (len(members), member_counts[archive]) for archive, members in covered.items()}
+
+
+def print_report(groups, coverage, top=20):
+    """Print a summary of the duplicate groups"""
+    with_loose = [group for group in groups if group['archives'] and group['loose']]
+    between_archives = [group for group in groups
+                        if len({item['archive'] for item in group['archives']}) > 1]
+    redundant = sum(group['size'] * (len(group['archives']) + len(group['loose']) - 1) for group in groups)
+
+    print("\nArchive duplicate report:")
+    print(f"  Archive members that also exist loose: {len(with_loose)}")
+    print(f"  Members found in more than one archive: {len(between_archives)}")
+    print(f"  Redundant data: {redundant / 1e9:.2f} GB")
+
+    complete = sorted((archive for archive, (found, total) in coverage.items() if total and found == total))
+    if complete:
+        print(f"\nArchives whose every member exists elsewhere ({len(complete)}):")
+        for archive in complete[:top]:
+            print(f"  {archive}")
+
+    partial = sorted(((found / total, archive, found, total) for archive, (found, total) in coverage.items()
+                      if total and found < total), reverse=True)
+    if partial:
+        print(f"\nPartially duplicated archives (top {min(top, len(partial))}):")
+        for ratio, archive, found, total in partial[:top]:
+            print(f"  {ratio:6.1%} ({found}/{total})  {archive}")
+
+    if groups:
+        print(f"\nLargest duplicate groups (top {min(top, len(groups))}):")
+        for group in groups[:top]:
+            print(f"  {group['size']:>14,} bytes  crc32 {group['crc32']}")
+            for item in group['archives']:
+                print(f"      {item['archive']} → {item['member']}")
+            for path in group['loose']:
+                print(f"      {path}")
+
+
+def main():
+    """Main entry point"""
+    args = parse_arguments()
+
+    for location in args.locations:
+        if not os.path.isdir(location):
+            logger.error(f"Location does not exist: {location}")
+            return 1
+
+    try:
+        scheduler = scheduler_from_args(args, max_workers=args.workers)
+        files = list_files(args.locations, args.inventory)
+        index, member_counts = build_index(files, scheduler, args.min_size)
+        groups = find_duplicates(index)
+        print_report(groups, archive_coverage(groups, member_counts), top=args.top)
+
+        if args.out:
+            with open(args.out, 'w') as file:
+                for group in groups:
+                    file.write(json.dumps(group) + '\n')
+            print(f"\nWrote {len(groups)} duplicate groups to {args.out}")
+        print(f"I/O: {scheduler.summary()}")
+        return 0
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
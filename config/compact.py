@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+compact.py - Pack many small cleanup files into a few compressed archives
+
+"Identify Log Files" and "Identify Temporary Files" move huge numbers of tiny
+files one by one, which costs a metadata round trip per file and leaves the
+destination with millions of inodes. Compaction streams the matched files into
+size-capped tar archives instead (gzip or xz, written as a stream), writes a
+sidecar index per archive for retrieval, and removes the sources only after the
+archive they went into has been finalized:
+
+    Logs-20240101-120000-0000.tar.gz                 the archive
+    Logs-20240101-120000-0000.tar.gz.index.jsonl     one line per member
+
+Members are named relative to the location the file was found in; a file whose
+name is already taken in the archive (e.g. app.log from a second location) is
+stored under its full path, and the index maps every member to its source.
+
+Rules are compacted instead of moved when they are listed in the `compact`
+section of organize.yaml (organize-tool ignores unknown top-level keys). The
+section is honoured when a plan is executed by organize_plan.py; the archives
+are written into the rule's move destination:
+
+    compact:
+    - rule: Identify Log Files
+      max_size: 1G          # uncompressed bytes per archive (default 1G)
+      compression: xz       # gz (default) or xz
+      prefix: Logs          # archive name prefix (default: the destination folder name)
+
+Existing folders can be compacted directly:
+
+    # Pack everything below Cleanup/Logs into archives in the same folder
+    python compact.py /path/to/Cleanup/Logs --recursive
+
+    # Only .tmp and .bak files, into another folder, preview first
+    python compact.py /path/to/files --dest /path/to/Cleanup/Temporary --extensions tmp,bak --dry-run
+
+    # Find a file again
+    grep -h 'report.log' /path/to/Cleanup/Logs/*.index.jsonl
+"""
+
+import os
+import sys
+import json
+import tarfile
+import threading
+import argparse
+import datetime
+import logging
+from pathlib import Path
+
+from io_scheduler import IOScheduler, add_io_arguments, parse_size, scheduler_from_args
+
+# Constants
+COMPRESSIONS = ('gz', 'xz')
+DEFAULT_COMPRESSION = 'gz'
+DEFAULT_MAX_SIZE = 1024 ** 3
+INDEX_SUFFIX = '.index.jsonl'
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(path):
+    """Return the (size, mtime_ns) fingerprint of a file, or None if it is missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def member_name(source, basedir=None):
+    """Name of a file inside the archive: relative to basedir if possible, else the full path"""
+    source = Path(source)
+    if basedir:
+        try:
+            return str(source.relative_to(basedir))
+        except ValueError:
+            pass
+    return str(source.relative_to(source.anchor))
+
+
+class ArchiveWriter:
+    """Streams files into a series of size-capped archives in one directory"""
+
+    def __init__(self, dest_dir, prefix=None, max_size=DEFAULT_MAX_SIZE, compression=DEFAULT_COMPRESSION,
+                 scheduler=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}' (use one of {', '.join(COMPRESSIONS)})")
+        self.dest_dir = Path(dest_dir)
+        self.prefix = prefix or self.dest_dir.name or 'archive'
+        self.max_size = int(parse_size(max_size))
+        self.compression = compression
+        self.scheduler = scheduler or IOScheduler()
+        self.stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.sequence = 0
+        self.tar = None
+        self.file = None
+        self.index_path = None
+        self.members = []
+        self.names = set()
+        self.size = 0
+        self.stats = {'archives': 0, 'files': 0, 'bytes': 0, 'kept': 0, 'dropped': 0}
+
+    def _open(self):
+        """
+        Start the next archive. The partial file is created exclusively, so writers
+        sharing a destination folder and prefix never write to the same file.
+        """
+        self.dest_dir.mkdir(parents=True, exist_ok=True)
+        while True:
+            self.path = self.dest_dir / f"{self.prefix}-{self.stamp}-{self.sequence:04d}.tar.{self.compression}"
+            self.sequence += 1
+            self.tmp_path = self.path.with_name(f".{self.path.name}.partial")
+            if self.path.exists() or self.path.with_name(self.path.name + INDEX_SUFFIX).exists():
+                continue
+            try:
+                fd = os.open(self.tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            except FileExistsError:
+                continue
+            break
+        self.file = os.fdopen(fd, 'wb')
+        try:
+            self.tar = tarfile.open(fileobj=self.file, mode=f"w|{self.compression}")
+        except Exception:
+            self.file.close()
+            self.file = None
+            self.tmp_path.unlink()
+            raise
+        self.index_path = None
+        self.members = []
+        self.names = set()
+        self.size = 0
+
+    def _unique_name(self, source, basedir):
+        """
+        Member name for source: relative to basedir, or the full path when another
+        member of the archive (e.g. from another location) already has that name
+        """
+        name = member_name(source, basedir)
+        if name in self.names:
+            name = member_name(source)
+        unique, counter = name, 2
+        while unique in self.names:
+            unique = f"{name}.{counter}"
+            counter += 1
+        self.names.add(unique)
+        return unique
+
+    def add(self, source, basedir=None, fp=None, scheduler=None):
+        """
+        Append a file to the current archive, starting a new one when the size cap
+        is reached. fp is the (size, mtime_ns) the file must still have when the
+        source is removed; scheduler overrides the writer's scheduler for this
+        file. Returns the archive the file goes into.
+        """
+        fp = fp or fingerprint(source)
+        if fp is None:
+            raise FileNotFoundError(f"No such file: {source}")
+        if self.tar is not None and self.members and self.size + fp[0] > self.max_size:
+            try:
+                self.finalize()
+            except Exception:
+                self.abort()
+                raise
+        if self.tar is None:
+            self._open()
+
+        name = self._unique_name(source, basedir)
+        try:
+            (scheduler or self.scheduler).call(self._append, source, name, fp, nbytes=fp[0])
+        except Exception:
+            self.names.discard(name)
+            raise
+        self.members.append({'member': name, 'source': str(source), 'size': fp[0], 'mtime_ns': fp[1]})
+        self.size += fp[0]
+        return self.path
+
+    def _append(self, source, name, fp):
+        """
+        Write one file into the stream. Errors while opening the source leave the
+        archive intact; only a failure after the header was written drops it.
+        """
+        with open(source, 'rb') as file:
+            info = self.tar.gettarinfo(arcname=name, fileobj=file)
+            if (info.size, os.fstat(file.fileno()).st_mtime_ns) != tuple(fp):
+                raise OSError(f"{source} changed since it was queued for compaction")
+            try:
+                self.tar.addfile(info, file)
+            except Exception:
+                self.abort()
+                raise
+
+    def abort(self):
+        """Drop the current archive; its sources are left in place"""
+        if self.tar is None and self.file is None and not self.members:
+            return
+        logger.error(f"Aborting {self.path}; its {len(self.members)} source files are kept")
+        for stream in (self.tar, self.file):
+            if stream is not None:
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+        # Only the files this writer created: the partial (created exclusively) and its index
+        for path in (self.tmp_path, self.index_path):
+            if path is not None and path.exists():
+                path.unlink()
+        self.stats['dropped'] += len(self.members)
+        self.tar = None
+        self.file = None
+        self.index_path = None
+        self.members = []
+        self.names = set()
+        self.size = 0
+
+    def finalize(self):
+        """Close the current archive, write its index and remove its sources"""
+        if self.tar is None:
+            return
+        tar, self.tar = self.tar, None
+        tar.close()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        file, self.file = self.file, None
+        file.close()
+
+        index_path = self.path.with_name(self.path.name + INDEX_SUFFIX)
+        with open(index_path, 'x') as file:
+            self.index_path = index_path
+            for member in self.members:
+                file.write(json.dumps(member) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self.tmp_path, self.path)
+        self.index_path = None
+        logger.info(f"Finalized {self.path} ({len(self.members)} files, {self.size / 1e6:.1f} MB)")
+
+        for member in self.members:
+            if fingerprint(member['source']) != (member['size'], member['mtime_ns']):
+                logger.warning(f"Keeping {member['source']}: changed after it was archived")
+                self.stats['kept'] += 1
+                continue
+            try:
+                os.remove(member['source'])
+            except OSError as e:
+                logger.error(f"Could not remove {member['source']} after archiving it: {e}")
+                self.stats['kept'] += 1
+        self.stats['archives'] += 1
+        self.stats['files'] += len(self.members)
+        self.stats['bytes'] += self.size
+        self.members = []
+
+
+class Compactor:
+    """
+    Routes the move actions of the configured rules into per-destination archive
+    writers. add() may be called from several threads; each writer packs one file
+    at a time, different writers run concurrently.
+    """
+
+    def __init__(self, entries=None, scheduler=None):
+        self.entries = {}
+        for entry in entries or []:
+            if not entry.get('rule'):
+                raise ValueError(f"Invalid compact entry (missing rule): {entry}")
+            if entry.get('compression', DEFAULT_COMPRESSION) not in COMPRESSIONS:
+                raise ValueError(f"Invalid compact entry (unknown compression): {entry}")
+            self.entries[entry['rule']] = entry
+        self.scheduler = scheduler
+        self.writers = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, scheduler=None):
+        """Create the compactor from a loaded organize.yaml configuration"""
+        return cls(config.get('compact') or [], scheduler)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def handles(self, rule):
+        """Check whether a rule's moves are compacted"""
+        return rule in self.entries
+
+    def add(self, rule, source, dest_dir, basedir=None, fp=None, scheduler=None):
+        """
+        Archive a file of a compacted rule into dest_dir; returns the archive path.
+        scheduler overrides the compactor's scheduler for this file.
+        """
+        entry = self.entries[rule]
+        key = (rule, str(dest_dir))
+        with self.lock:
+            writer = self.writers.get(key)
+            if writer is None:
+                writer = self.writers[key] = ArchiveWriter(
+                    dest_dir, prefix=entry.get('prefix'), max_size=entry.get('max_size', DEFAULT_MAX_SIZE),
+                    compression=entry.get('compression', DEFAULT_COMPRESSION), scheduler=self.scheduler)
+                self.locks[key] = threading.Lock()
+            lock = self.locks[key]
+        with lock:
+            return writer.add(source, basedir, fp, scheduler)
+
+    def close(self):
+        """
+        Finalize all open archives and return the combined statistics. An archive
+        that cannot be finalized is dropped; its sources stay in place and are
+        counted as dropped.
+        """
+        stats = {'archives': 0, 'files': 0, 'bytes': 0, 'kept': 0, 'dropped': 0}
+        for writer in self.writers.values():
+            try:
+                writer.finalize()
+            except Exception as e:
+                logger.error(f"Failed to finalize {writer.path}: {e}")
+                writer.abort()
+            for key in stats:
+                stats[key] += writer.stats[key]
+        return stats
+
+
+def find_files(source_dir, recursive=False, extensions=None, skip=()):
+    """Return the files to compact, skipping archives and indexes written by this script"""
+    files = []
+    for root, dirs, names in os.walk(source_dir):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            if path in skip or name.endswith(INDEX_SUFFIX) or name.endswith('.partial'):
+                continue
+            if any(name.endswith(f".tar.{compression}") for compression in COMPRESSIONS):
+                continue
+            if extensions and os.path.splitext(name)[1][1:].lower() not in extensions:
+                continue
+            if os.path.isfile(path) and not os.path.islink(path):
+                files.append(path)
+        if not recursive:
+            break
+        dirs.sort()
+    return files
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Pack many small files into size-capped compressed archives',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('source_dir', help='Directory containing the files to compact')
+    parser.add_argument('--dest', '-d', help='Directory for the archives (default: source_dir)')
+    parser.add_argument('--recursive', '-r', action='store_true', help='Process subdirectories')
+    parser.add_argument('--extensions', '-e', help='Comma-separated extensions to compact (default: all)')
+    parser.add_argument('--max-size', default='1G',
+                        help='Uncompressed bytes per archive, e.g. 500M (default: 1G)')
+    parser.add_argument('--compression', '-c', choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help=f'Stream compressor (default: {DEFAULT_COMPRESSION})')
+    parser.add_argument('--prefix', help='Archive name prefix (default: the destination folder name)')
+    parser.add_argument('--dry-run', '-n', action='store_true', help='Only report what would be packed')
+    add_io_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point"""
+    args = parse_arguments()
+
+    if not os.path.isdir(args.source_dir):
+        logger.error(f"Source directory does not exist: {args.source_dir}")
+        return 1
+
+    extensions = {e.strip().lstrip('.').lower() for e in args.extensions.split(',')} if args.extensions else None
+    files = find_files(args.source_dir, args.recursive, extensions)
+    total = sum(os.path.getsize(path) for path in files)
+    dest_dir = args.dest or args.source_dir
+    logger.info(f"Found {len(files)} files ({total / 1e6:.1f} MB) to compact into {dest_dir}")
+    if args.dry_run:
+        archives = -(-total // int(parse_size(args.max_size))) if total else 0
+        logger.info(f"Would write about {archives} archive(s); no files were changed.")
+        return 0
+
+    scheduler = scheduler_from_args(args)
+    writer = ArchiveWriter(dest_dir, prefix=args.prefix, max_size=args.max_size,
+                           compression=args.compression, scheduler=scheduler)
+    errors = 0
+    for path in files:
+        try:
+            writer.add(path, basedir=args.source_dir)
+        except Exception as e:
+            logger.error(f"Failed to compact {path}: {e}")
+            errors += 1
+    try:
+        writer.finalize()
+    except Exception as e:
+        logger.error(f"Failed to finalize {writer.path}: {e}")
+        writer.abort()
+        return 1
+
+    stats = writer.stats
+    logger.info("\nSummary:")
+    logger.info(f"  Archives written: {stats['archives']}")
+    logger.info(f"  Files packed and removed: {stats['files'] - stats['kept']}")
+    logger.info(f"  Kept (changed while packing): {stats['kept']}")
+    if stats['dropped']:
+        logger.info(f"  Left in place (archive dropped): {stats['dropped']}")
+    logger.info(f"  Data packed: {stats['bytes'] / 1e6:.1f} MB")
+    logger.info(f"  Errors: {errors}")
+    logger.info(f"  I/O: {scheduler.summary()}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+config_cache.py - Compiled, cached loading of large organize.yaml files
+
+Every invocation used to re-parse the 1000+ line organize.yaml with the
+pure-Python YAML loader and let organize-tool recompile every template of every
+rule. For watch mode and short cron runs that is a noticeable fixed cost. This
+module keeps a compiled copy of the configuration keyed by a hash of the file's
+content:
+
+- the YAML is parsed with the libyaml C loader when it is available,
+- the parsed configuration and the compiled code of organize-tool's templates
+  are stored in a cache file and reused until the YAML changes.
+
+The cache lives in ~/.cache/organize-files (or $ORGANIZE_FILES_CACHE) and is
+rebuilt automatically whenever the configuration file changes.
+
+Usage:
+    # Run or simulate organize-tool with the cached configuration
+    python config_cache.py run organize.yaml
+    python config_cache.py sim organize.yaml --format JSONL
+
+    # Compare startup times with and without the cache
+    python config_cache.py benchmark organize.yaml
+"""
+
+import os
+import sys
+import time
+import marshal
+import pickle
+import hashlib
+import argparse
+import importlib.metadata
+from pathlib import Path
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+    LIBYAML_AVAILABLE = True
+except ImportError:
+    from yaml import SafeLoader
+    LIBYAML_AVAILABLE = False
+
+# Constants
+CACHE_VERSION = 1
+CACHE_DIR = Path(os.environ.get('ORGANIZE_FILES_CACHE', '~/.cache/organize-files')).expanduser()
+
+
+def default_yaml_cnst(loader, tag_suffix, node):
+    """Keep strings starting with an exclamation mark as strings, like organize-tool does"""
+    return str(node.tag)
+
+
+yaml.add_multi_constructor("", default_yaml_cnst, Loader=SafeLoader)
+
+
+def cache_key(text):
+    """Hash of the configuration content and everything the cached data depends on"""
+    try:
+        import jinja2
+        jinja_version = jinja2.__version__
+    except ImportError:
+        jinja_version = ''
+    try:
+        # The cached rules hold organize-tool's compiled templates
+        organize_version = importlib.metadata.version('organize-tool')
+    except importlib.metadata.PackageNotFoundError:
+        organize_version = ''
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_VERSION}:{sys.version}:{yaml.__version__}:{jinja_version}:{organize_version}\n".encode())
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_path(config_path, key):
+    """Cache file for a configuration file; one file per config path"""
+    path_id = hashlib.md5(str(Path(config_path).resolve()).encode()).hexdigest()[:12]
+    return CACHE_DIR / f"{path_id}-{key[:16]}.pickle"
+
+
+def read_cache(path):
+    """Return the cached entry, or None if it is missing or unreadable"""
+    try:
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+    except Exception:
+        return None
+
+
+def write_cache(path, entry):
+    """Atomically write a cache entry and drop outdated entries of the same config"""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        prefix = path.name.split('-')[0] + '-'
+        for old in CACHE_DIR.glob(prefix + '*.pickle'):
+            if old != path:
+                old.unlink()
+    except OSError as e:
+        # The cache is an optimization only
+        print(f"Warning: Could not write config cache {path}: {e}", file=sys.stderr)
+
+
+class CachedConfig:
+    """A configuration file together with its cache entry"""
+
+    def __init__(self, config_path):
+        self.config_path = Path(config_path)
+        text = self.config_path.read_text(encoding='utf-8')
+        try:
+            from organize.utils import normalize_unicode
+            text = normalize_unicode(text)
+        except ImportError:
+            pass
+
+        self.key = cache_key(text)
+        self.path = cache_path(self.config_path, self.key)
+        self.entry = read_cache(self.path)
+        self.dirty = False
+        if self.entry is None or self.entry.get('key') != self.key:
+            self.entry = {'key': self.key, 'data': yaml.load(text, Loader=SafeLoader), 'templates': {}}
+            self.dirty = True
+
+    @property
+    def data(self):
+        """A fresh copy of the parsed configuration (callers may modify it)"""
+        return pickle.loads(pickle.dumps(self.entry['data'], protocol=pickle.HIGHEST_PROTOCOL))
+
+    def save(self):
+        """Write the cache entry if anything new was parsed or compiled"""
+        if self.dirty:
+            write_cache(self.path, self.entry)
+            self.dirty = False
+
+    def install_templates(self, environment):
+        """
+        Make a jinja2 environment reuse the cached compiled templates.
+        New templates are compiled once and added to the cache entry.
+        """
+        templates = self.entry['templates']
+        codes = {source: marshal.loads(code) for source, code in templates.items()}
+
+        def from_string(source, globals=None, template_class=None):
+            code = codes.get(source)
+            if code is None:
+                code = codes[source] = environment.compile(source)
+                templates[source] = marshal.dumps(code)
+                self.dirty = True
+            cls = template_class or environment.template_class
+            return cls.from_code(environment, code, environment.make_globals(globals))
+
+        environment.from_string = from_string
+
+
+def load_yaml(config_path):
+    """Load a YAML configuration file through the cache and return the parsed data"""
+    cached = CachedConfig(config_path)
+    cached.save()
+    return cached.data
+
+
+def load_organize_config(config_path):
+    """Load a configuration as an organize-tool Config object with precompiled templates"""
+    from organize.config import Config
+    from organize.errors import ConfigError
+    from organize.template import Template
+    from pydantic import ValidationError
+
+    cached = CachedConfig(config_path)
+    cached.install_templates(Template)
+    try:
+        config = Config(**cached.data)
+    except ValidationError as e:
+        raise ConfigError(e=e, config_path=cached.config_path) from e
+    config._config_path = cached.config_path
+    cached.save()
+    return config
+
+
+def run_organize(config_path, simulate, output_format='default'):
+    """Run or simulate organize-tool with the cached configuration"""
+    from organize.output import JSONL, Default
+
+    output_format = output_format.lower()
+    if output_format == 'jsonl':
+        output = JSONL()
+    else:
+        output = Default(errors_only=output_format == 'errorsonly')
+    config = load_organize_config(config_path)
+    config.execute(simulate=simulate, output=output, working_dir=os.getcwd())
+
+
+def benchmark(config_path, repeat=5):
+    """Print the startup cost of loading the configuration with and without the cache"""
+    from organize.config import Config
+    from organize.template import Template
+
+    text = Path(config_path).read_text(encoding='utf-8')
+    original_from_string = Template.from_string
+
+    def best_of(func):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times) * 1000
+
+    def uncached():
+        Template.from_string = original_from_string
+        Config(**yaml.load(text, Loader=yaml.SafeLoader))
+
+    def warm_cache():
+        load_organize_config(config_path)
+
+    # Make sure the cache is populated before measuring the warm path
+    warm_cache()
+    print(f"Startup benchmark for {config_path} (best of {repeat}):")
+    print(f"  YAML parse (pure Python):       {best_of(lambda: yaml.load(text, Loader=yaml.SafeLoader)):8.1f} ms")
+    if LIBYAML_AVAILABLE:
+        print(f"  YAML parse (libyaml):           {best_of(lambda: yaml.load(text, Loader=SafeLoader)):8.1f} ms")
+    print(f"  Cached parsed YAML:             {best_of(lambda: load_yaml(config_path)):8.1f} ms")
+    print(f"  organize-tool config, uncached: {best_of(uncached):8.1f} ms")
+    print(f"  organize-tool config, cached:   {best_of(warm_cache):8.1f} ms")
+    Template.from_string = original_from_string
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Run organize-tool with a compiled, cached configuration',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('command', choices=['run', 'sim', 'benchmark'],
+                        help='Run, simulate or benchmark the configuration')
+    parser.add_argument('config', help='Path to the organize-tool configuration file')
+    parser.add_argument('--format', '-F', default='default', type=str.lower,
+                        choices=['default', 'errorsonly', 'jsonl'],
+                        help='Output format for run/sim (default: default)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of repetitions for the benchmark (default: 5)')
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point"""
+    args = parse_arguments()
+
+    if not os.path.exists(args.config):
+        print(f"Error: Config file not found: {args.config}", file=sys.stderr)
+        return 1
+
+    try:
+        if args.command == 'benchmark':
+            benchmark(args.config, repeat=args.repeat)
+        else:
+            run_organize(args.config, simulate=args.command == 'sim', output_format=args.format)
+        return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
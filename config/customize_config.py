@@ -12,15 +12,54 @@ import sys
 import yaml
 import argparse
 import re
+import io
+import copy
+import time
+import contextlib
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, Counter, deque
+
+from config_cache import load_yaml
+from io_scheduler import group_by_device
+from layout import parse_fanout, normalize_dir
+
+# The standard folder structure below the destination base
+STANDARD_FOLDERS = [
+    'Organized/Documents/Text',
+    'Organized/Documents/Office',
+    'Organized/Documents/PDF',
+    'Organized/Documents/Other',
+    'Organized/Media/Images/Photos',
+    'Organized/Media/Images/Raw',
+    'Organized/Media/Images/Vector',
+    'Organized/Media/Images/Adobe',
+    'Organized/Media/Audio/Playlists',
+    'Organized/Media/Video',
+    'Organized/Development/Code',
+    'Organized/Development/Web',
+    'Organized/Development/Data/Database',
+    'Organized/Archives/Split',
+    'Organized/Applications',
+    'Organized/Fonts',
+    'Organized/System/Config',
+    'Organized/Other/NoExtension',
+    'Cleanup/Temporary',
+    'Cleanup/Logs',
+    'Cleanup/System',
+    'Cleanup/ErrorReports',
+    'Cleanup/Duplicates/Music',
+    'Cleanup/Duplicates/Images',
+    'Cleanup/Duplicates/Videos',
+    'Cleanup/Duplicates/Other',
+    'Cleanup/URLFragments',
+    'Cleanup/Unknown',
+]
 
 
 def load_config(config_path):
-    """Load the YAML configuration file."""
+    """Load the YAML configuration file (parsed once per content, see config_cache.py)."""
     try:
-        with open(config_path, 'r') as file:
-            return yaml.safe_load(file)
+        return load_yaml(config_path)
     except Exception as e:
         print(f"Error loading configuration file: {e}")
         sys.exit(1)
@@ -37,82 +76,46 @@ def save_config(config, config_path):
         sys.exit(1)
 
 
-def update_source_directories(config, source_dir):
-    """Update all source directories in the configuration to a static value."""
+def update_source_directories(config, source_dirs):
+    """
+    Set the source directories of every rule.
+    source_dirs is one path or a list of paths; with several paths each rule gets
+    one location per path, keeping the options of its first location.
+    """
+    if isinstance(source_dirs, str):
+        source_dirs = [source_dirs]
     count = 0
     for rule in config.get('rules', []):
         if 'locations' in rule:
             # Convert to list if it's not already
             if not isinstance(rule['locations'], list):
                 rule['locations'] = [rule['locations']]
+            if not rule['locations']:
+                continue
             
-            # Replace all locations with the new source directory
-            for i, location in enumerate(rule['locations']):
-                if isinstance(location, dict) and 'path' in location:
-                    rule['locations'][i]['path'] = source_dir
-                    count += 1
-                elif isinstance(location, str):
-                    rule['locations'][i] = source_dir
-                    count += 1
-    
-    print(f"Updated {count} source directory references to: {source_dir}")
+            # Replace all locations with one location per source directory
+            template = rule['locations'][0]
+            if isinstance(template, dict) and 'path' in template:
+                rule['locations'] = [dict(copy.deepcopy(template), path=source_dir) for source_dir in source_dirs]
+            else:
+                rule['locations'] = list(source_dirs)
+            count += 1
+    
+    print(f"Updated the locations of {count} rules to: {', '.join(source_dirs)}")
     return config
 
 
-def update_destination_base(config, dest_base):
+def update_destination_base(config, dest_base, index=None):
     """Update all destination directories to use the new base path while preserving the folder structure."""
     count = 0
     
-    # Normalize dest_base to remove trailing slash
-    dest_base = dest_base.rstrip('/')
-    
-    # Define the standard folder structure based on the user's specification
-    organized_paths = {
-        'Documents/Text/': f"{dest_base}/Organized/Documents/Text/",
-        'Documents/Office/': f"{dest_base}/Organized/Documents/Office/",
-        'Documents/PDF/': f"{dest_base}/Organized/Documents/PDF/",
-        'Documents/Other/': f"{dest_base}/Organized/Documents/Other/",
-        'Media/Images/Photos/': f"{dest_base}/Organized/Media/Images/Photos/",
-        'Media/Images/Raw/': f"{dest_base}/Organized/Media/Images/Raw/",
-        'Media/Images/Vector/': f"{dest_base}/Organized/Media/Images/Vector/",
-        'Media/Images/Adobe/': f"{dest_base}/Organized/Media/Images/Adobe/",
-        'Media/Audio/': f"{dest_base}/Organized/Media/Audio/",
-        'Media/Audio/Playlists/': f"{dest_base}/Organized/Media/Audio/Playlists/",
-        'Media/Video/': f"{dest_base}/Organized/Media/Video/",
-        'Development/Code/': f"{dest_base}/Organized/Development/Code/",
-        'Development/Web/': f"{dest_base}/Organized/Development/Web/",
-        'Development/Data/': f"{dest_base}/Organized/Development/Data/",
-        'Development/Data/Database/': f"{dest_base}/Organized/Development/Data/Database/",
-        'Archives/': f"{dest_base}/Organized/Archives/",
-        'Archives/Split/': f"{dest_base}/Organized/Archives/Split/",
-        'Applications/': f"{dest_base}/Organized/Applications/",
-        'Fonts/': f"{dest_base}/Organized/Fonts/",
-        'System/Config/': f"{dest_base}/Organized/System/Config/",
-        'Other/': f"{dest_base}/Organized/Other/",
-        'Other/NoExtension/': f"{dest_base}/Organized/Other/NoExtension/",
-        'Cleanup/Temporary/': f"{dest_base}/Cleanup/Temporary/",
-        'Cleanup/Logs/': f"{dest_base}/Cleanup/Logs/",
-        'Cleanup/System/': f"{dest_base}/Cleanup/System/",
-        'Cleanup/ErrorReports/': f"{dest_base}/Cleanup/ErrorReports/",
-        'Cleanup/Duplicates/': f"{dest_base}/Cleanup/Duplicates/",
-        'Cleanup/Duplicates/Music/': f"{dest_base}/Cleanup/Duplicates/Music/",
-        'Cleanup/Duplicates/Images/': f"{dest_base}/Cleanup/Duplicates/Images/",
-        'Cleanup/Duplicates/Videos/': f"{dest_base}/Cleanup/Duplicates/Videos/",
-        'Cleanup/Duplicates/Other/': f"{dest_base}/Cleanup/Duplicates/Other/",
-        'Cleanup/URLFragments/': f"{dest_base}/Cleanup/URLFragments/",
-        'Cleanup/Unknown/': f"{dest_base}/Cleanup/Unknown/",
-    }
+    # The index is built once per base and can be shared between configurations
+    if index is None:
+        index = DestinationIndex(dest_base)
+    dest_base = index.dest_base
     
-    # Add additional mappings for common path patterns
-    additional_mappings = {
-        # Add mappings for paths with just the category name
-        'Organized': f"{dest_base}/Organized",
-        'Cleanup': f"{dest_base}/Cleanup",
-        # Add mappings for paths with /Organized/ or /Cleanup/
-        '/Organized/': f"{dest_base}/Organized/",
-        '/Cleanup/': f"{dest_base}/Cleanup/",
-    }
-    organized_paths.update(additional_mappings)
+    # Old destination directory -> new one, used to carry fan-out layouts along
+    moved_dirs = {}
     
     for rule in config.get('rules', []):
         if 'actions' in rule:
@@ -121,125 +124,160 @@ def update_destination_base(config, dest_base):
                     if isinstance(action['move'], dict) and 'dest' in action['move']:
                         old_dest = action['move']['dest']
                         
-                        # Extract the relative path pattern
-                        new_dest = update_path(old_dest, dest_base, organized_paths)
+                        # Rewrite the base, keeping the relative folder structure
+                        new_dest = index.rewrite(old_dest)
                         if new_dest != old_dest:
                             action['move']['dest'] = new_dest
+                            moved_dirs[normalize_dir(destination_directory(old_dest))] = destination_directory(new_dest)
                             count += 1
                     
                     elif isinstance(action['move'], str):
                         old_dest = action['move']
                         
-                        # Extract the relative path pattern
-                        new_dest = update_path(old_dest, dest_base, organized_paths)
+                        # Rewrite the base, keeping the relative folder structure
+                        new_dest = index.rewrite(old_dest)
                         if new_dest != old_dest:
                             action['move'] = new_dest
+                            moved_dirs[normalize_dir(destination_directory(old_dest))] = destination_directory(new_dest)
                             count += 1
     
+    # Fan-out layouts are keyed by destination directory, move them along with the rules.
+    # A layout dest is always a directory, with or without a trailing slash
+    for entry in config.get('layout') or []:
+        if 'dest' in entry:
+            old_dir = entry['dest'].rstrip('/') + '/'
+            entry['dest'] = moved_dirs.get(normalize_dir(old_dir)) or index.rewrite(old_dir)
+    
     print(f"Updated {count} destination directory references to use base: {dest_base}")
     return config
 
 
-def update_path(old_path, dest_base, organized_paths):
-    """Update a path to use the new destination base while preserving folder structure."""
-    # Handle paths with placeholders like {extension}
-    if '{' in old_path and '}' in old_path:
-        # Find the most appropriate match in organized_paths
-        best_match = None
-        best_match_len = 0
-        
-        for pattern_key, full_path in organized_paths.items():
-            # Check if this pattern is a good match for our path
-            # We look for the pattern without placeholders
-            pattern_parts = pattern_key.split('{')[0].strip('/')
-            if pattern_parts and pattern_parts in old_path.split('{')[0]:
-                if len(pattern_parts) > best_match_len:
-                    best_match = pattern_key
-                    best_match_len = len(pattern_parts)
-        
-        if best_match:
-            # Extract the placeholder part
-            placeholder_part = old_path.split('/')[-1] if '/' in old_path else old_path
-            if not '{' in placeholder_part:  # No placeholder in the last part
-                base_path = organized_paths[best_match]
-                return base_path
-            else:
-                # Get the base path without the file part
-                base_path = '/'.join(organized_paths[best_match].split('/')[:-1])
-                return f"{base_path}/{placeholder_part}"
-        
-        # If no good match, just replace the base
-        path_parts = old_path.split('/')
-        rel_path_start = 0
+def destination_directory(dest):
+    """Return the directory a move destination puts files into (with trailing slash)."""
+    # A trailing slash means "move into this directory", otherwise the
+    # last component is the (templated) file name
+    if dest.endswith('/'):
+        return dest
+    return os.path.dirname(dest) + '/'
+
+
+def get_move_directories(config):
+    """Return the destination directories of all move actions in the configuration."""
+    directories = []
+    for rule in config.get('rules', []):
+        for action in rule.get('actions', []):
+            if isinstance(action, dict) and 'move' in action:
+                dest = action['move'].get('dest') if isinstance(action['move'], dict) else action['move']
+                if not isinstance(dest, str):
+                    continue
+                directory = destination_directory(dest)
+                if directory not in directories:
+                    directories.append(directory)
+    return directories
+
+
+def update_layout(config, fanouts):
+    """
+    Add, replace or remove fan-out layouts for destination directories.
+    Each fan-out is given as CATEGORY=MODE, e.g. 'Organized/Other=hash',
+    'Cleanup/Duplicates=date:exif' or 'Organized/Other=none' to remove it.
+    """
+    layout = config.get('layout') or []
+    count = 0
+    
+    for fanout in fanouts:
+        category, sep, spec = fanout.partition('=')
+        if not sep or not category.strip('/'):
+            print(f"Error: Invalid fan-out '{fanout}', expected CATEGORY=MODE")
+            sys.exit(1)
         
-        # Find where the actual relative path starts
-        for i, part in enumerate(path_parts):
-            if part.startswith('{') or 'Organized' in part or 'Cleanup' in part:
-                rel_path_start = i
-                break
+        # Match whole path components, so 'Organized/Other' does not match 'Organized/OtherStuff'
+        pattern = '/' + category.strip('/').lower() + '/'
+        directories = [d for d in get_move_directories(config) if pattern in '/' + d.lower()]
+        if not directories:
+            print(f"Warning: No move destination matches '{category}'")
+            continue
         
-        rel_path = '/'.join(path_parts[rel_path_start:])
-        return f"{dest_base}/{rel_path}"
+        targets = {normalize_dir(d) for d in directories}
+        layout = [entry for entry in layout if normalize_dir(entry.get('dest', '')) not in targets]
+        if spec.strip().lower() != 'none':
+            try:
+                entry = parse_fanout(spec)
+            except ValueError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            layout.extend(dict(dest=d, **entry) for d in directories)
+        count += len(directories)
+    
+    if layout:
+        config['layout'] = layout
     else:
-        # Handle direct paths without placeholders
-        # First try exact matches
-        for pattern_key, full_path in organized_paths.items():
-            if pattern_key.strip('/') in old_path:
-                # Match found, replace with the new full path
-                return full_path
-        
-        # If no exact match, try to match based on path components
-        old_path_lower = old_path.lower()
-        for pattern_key, full_path in organized_paths.items():
-            pattern_parts = pattern_key.lower().split('/')
-            for part in pattern_parts:
-                if part and part in old_path_lower:
-                    # Found a matching component, extract the relative path
-                    path_parts = old_path.split('/')
-                    
-                    # Find the index of the matching part
-                    match_idx = -1
-                    for i, p in enumerate(path_parts):
-                        if part.lower() in p.lower():
-                            match_idx = i
-                            break
-                    
-                    if match_idx >= 0:
-                        # Extract the relative path from the matching part onwards
-                        rel_path = '/'.join(path_parts[match_idx:])
-                        # Replace the pattern key part with the full path
-                        return full_path
-        
-        # If still no match, handle as general case
-        path_parts = old_path.split('/')
+        config.pop('layout', None)
+    
+    print(f"Updated fan-out layout for {count} destination directories")
+    return config
+
+
+class DestinationIndex:
+    """
+    Component trie over the standard folder structure for one destination base.
+    
+    Each destination is rewritten with a single walk over its path components:
+    everything up to the last Organized/ or Cleanup/ component is the old base,
+    the longest known folder below it is mapped to its canonical spelling and
+    any remaining components (sub folders, file name templates) are kept.
+    """
+    
+    def __init__(self, dest_base):
+        # Normalize dest_base to remove trailing slash
+        self.dest_base = dest_base.rstrip('/')
+        # lowercase component -> (canonical name, children)
+        self.root = {}
+        for folder in STANDARD_FOLDERS:
+            node = self.root
+            for part in folder.split('/'):
+                node = node.setdefault(part.lower(), (part, {}))[1]
+    
+    def rewrite(self, old_path):
+        """Return old_path moved onto the destination base."""
+        parts = old_path.split('/')
         
-        # Find where the actual relative path starts after home or base dir
-        rel_path_start = 0
-        for i, part in enumerate(path_parts):
-            if part.lower() in ('organized', 'cleanup', 'documents', 'media', 'development', 
-                               'archives', 'applications', 'fonts', 'system', 'other'):
-                rel_path_start = i
+        # Find where the relative folder structure starts
+        anchor = None
+        for i in range(len(parts) - 1, -1, -1):
+            if parts[i].lower() in self.root:
+                anchor = i
                 break
         
-        # Build the new path with the destination base
-        if rel_path_start > 0:
-            rel_path = '/'.join(path_parts[rel_path_start:])
-            # Check if this is a Cleanup path
-            if path_parts[rel_path_start].lower() == 'cleanup' or any(cleanup_term in rel_path.lower() 
-                                                                     for cleanup_term in ['duplicates', 'temporary', 'logs', 'unknown']):
-                return f"{dest_base}/{rel_path}"
-            else:
-                # Default to Organized path
-                return f"{dest_base}/{rel_path}"
-        else:
-            # Fallback - determine if this is likely a Cleanup or Organized path
-            path_lower = old_path.lower()
-            if any(cleanup_term in path_lower for cleanup_term in ['cleanup', 'duplicates', 'temporary', 'logs', 'unknown']):
-                # This looks like a Cleanup path
-                return f"{dest_base}/Cleanup/{os.path.basename(old_path)}"
-            else:
-                # Default to Organized/Other
-                return f"{dest_base}/Organized/Other/{os.path.basename(old_path)}"
+        if anchor is None:
+            return self._rewrite_unanchored(parts)
+        return self._walk(self.root, parts, anchor, [])
+    
+    def _walk(self, node, parts, start, matched):
+        """Follow the trie from parts[start] and append the unmatched remainder."""
+        i = start
+        while i < len(parts) and parts[i].lower() in node:
+            name, node = node[parts[i].lower()]
+            matched.append(name)
+            i += 1
+        return '/'.join([self.dest_base] + matched + parts[i:])
+    
+    def _rewrite_unanchored(self, parts):
+        """Handle paths without an Organized/ or Cleanup/ component, e.g. ~/Sorted/Documents/Text/."""
+        for i, part in enumerate(parts):
+            for category in ('organized', 'cleanup'):
+                name, children = self.root[category]
+                if part.lower() in children:
+                    return self._walk(children, parts, i, [name])
+        
+        # Fallback - determine if this is likely a Cleanup or Organized path
+        path_lower = '/'.join(parts).lower()
+        basename = parts[-1]
+        if any(cleanup_term in path_lower for cleanup_term in ['cleanup', 'duplicates', 'temporary', 'logs', 'unknown']):
+            # This looks like a Cleanup path
+            return f"{self.dest_base}/Cleanup/{basename}"
+        # Default to Organized/Other
+        return f"{self.dest_base}/Organized/Other/{basename}"
 
 
 def find_base_directory(paths):
@@ -366,6 +404,278 @@ def display_directory_structure(config):
     print(f"  - Organized paths: {dest_categories['Organized']}")
     print(f"  - Cleanup paths: {dest_categories['Cleanup']}")
     print(f"  - Total paths: {len(all_dest_paths)}")
+    
+    # Fan-out layouts applied when running through organize_plan.py
+    layout = config.get('layout') or []
+    if layout:
+        print("\nFan-out Layout:")
+        for entry in layout:
+            rel_path = entry.get('dest', '')
+            if base_dir and rel_path.startswith(base_dir):
+                rel_path = rel_path[len(base_dir):].lstrip('/')
+            options = ', '.join(f"{k}={v}" for k, v in entry.items() if k not in ('dest', 'fanout'))
+            print(f"  - {rel_path}: {entry.get('fanout')}" + (f" ({options})" if options else ""))
+
+
+def split_regex_alternatives(expr):
+    """
+    Return the alternatives of the extension group in a regex like '.*\\.(a|b|c)$',
+    or None if the expression does not have that shape.
+    """
+    start = expr.find('\\.(')
+    if start < 0:
+        return None
+    
+    alternatives = []
+    current = ''
+    depth = 0
+    i = start + 3
+    while i < len(expr):
+        char = expr[i]
+        if char == '\\' and i + 1 < len(expr):
+            current += expr[i:i + 2]
+            i += 2
+            continue
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            if depth == 0:
+                alternatives.append(current)
+                return alternatives
+            depth -= 1
+        elif char == '|' and depth == 0:
+            alternatives.append(current)
+            current = ''
+            i += 1
+            continue
+        current += char
+        i += 1
+    return None
+
+
+def get_rule_extensions(rule):
+    """
+    Return (extensions, regex_alternatives, extension_only) for a rule.
+    extensions is None if the rule is not restricted to a list of extensions.
+    extension_only tells whether the extension is the rule's only filter.
+    """
+    extensions = None
+    alternatives = []
+    other_filters = 0
+    for f in rule.get('filters') or []:
+        if isinstance(f, dict) and 'extension' in f:
+            values = f['extension']
+            values = values if isinstance(values, list) else [values]
+            extensions = (extensions or []) + [str(v).lower().lstrip('.') for v in values]
+        elif isinstance(f, dict) and 'regex' in f:
+            expr = f['regex']['expr'] if isinstance(f['regex'], dict) else f['regex']
+            found = split_regex_alternatives(str(expr))
+            if found is not None:
+                alternatives.extend(found)
+                extensions = (extensions or []) + [a.lower() for a in found]
+            other_filters += found is None
+        else:
+            other_filters += 1
+    return extensions, alternatives, other_filters == 0 and extensions is not None
+
+
+def get_rule_locations(rule):
+    """Return the location paths of a rule."""
+    locations = rule.get('locations') or []
+    if not isinstance(locations, list):
+        locations = [locations]
+    paths = []
+    for location in locations:
+        if isinstance(location, dict) and 'path' in location:
+            paths.append(location['path'])
+        elif isinstance(location, str):
+            paths.append(location)
+    return paths
+
+
+def moves_out_of(rule, locations):
+    """Check whether a rule moves its matches to a directory outside all of the locations."""
+    for action in rule.get('actions') or []:
+        if isinstance(action, dict) and 'move' in action:
+            dest = action['move'].get('dest') if isinstance(action['move'], dict) else action['move']
+            if not isinstance(dest, str):
+                return False
+            dest = os.path.expanduser(dest)
+            return not any(dest.startswith(os.path.expanduser(loc).rstrip('/') + '/') for loc in locations)
+    return False
+
+
+def sample_location(path, max_entries):
+    """
+    Walk a location breadth-first until max_entries entries have been seen.
+    Returns (entries_seen, estimated_total, seconds_per_entry, complete).
+    """
+    pending = deque([path])
+    dirs_done = 0
+    seen = 0
+    start = time.perf_counter()
+    while pending and seen < max_entries:
+        directory = pending.popleft()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    seen += 1
+                    # Rules look at the file's stat, so time that too
+                    entry.stat(follow_symlinks=False)
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+        except OSError:
+            pass
+        dirs_done += 1
+    elapsed = time.perf_counter() - start
+    
+    complete = not pending
+    estimated = seen if complete else int(seen * (dirs_done + len(pending)) / max(dirs_done, 1))
+    return seen, estimated, elapsed / max(seen, 1), complete
+
+
+def analyze_rules(config, sample=0):
+    """
+    Report rules that compete for the same extensions, rules that can never match,
+    duplicated extensions and how often each location is walked.
+    """
+    rules = [rule for rule in config.get('rules', []) if rule.get('enabled', True)]
+    
+    # Extension -> rules and location -> rules indexes
+    extension_index = defaultdict(list)
+    location_index = defaultdict(list)
+    rule_info = []
+    for rule in rules:
+        name = rule.get('name', '(unnamed)')
+        extensions, alternatives, extension_only = get_rule_extensions(rule)
+        locations = get_rule_locations(rule)
+        rule_info.append((rule, name, extensions, extension_only, locations))
+        for extension in sorted(set(extensions or [])):
+            extension_index[extension].append(name)
+        for location in locations:
+            location_index[location].append(name)
+    
+    print("\nRule Analysis:")
+    
+    # Extensions listed more than once within the same rule
+    print("\nRepeated extensions within a rule:")
+    found = False
+    for rule, name, extensions, extension_only, locations in rule_info:
+        repeated = sorted(ext for ext, count in Counter(extensions or []).items() if count > 1)
+        if repeated:
+            found = True
+            print(f"  - {name}: {', '.join(repeated)}")
+    if not found:
+        print("  (none)")
+    
+    # Extensions matched by several rules
+    overlaps = {ext: names for ext, names in extension_index.items() if len(names) > 1}
+    print(f"\nExtensions matched by more than one rule: {len(overlaps)}")
+    by_rules = defaultdict(list)
+    for ext, names in overlaps.items():
+        by_rules[tuple(names)].append(ext or "''")
+    for names, exts in sorted(by_rules.items(), key=lambda item: -len(item[1])):
+        print(f"  - {', '.join(sorted(exts))}")
+        print(f"      {' → '.join(names)}")
+    
+    # Rules whose extensions are all taken by earlier rules that move them away
+    print("\nShadowed rules (extensions moved away by an earlier rule on the same location):")
+    found = False
+    claimed = defaultdict(dict)
+    for rule, name, extensions, extension_only, locations in rule_info:
+        if extensions is not None:
+            shadowed = {}
+            for ext in set(extensions):
+                owners = [claimed[loc].get(ext) for loc in locations]
+                if locations and all(owners):
+                    shadowed[ext] = owners[0]
+            if shadowed and len(shadowed) == len(set(extensions)):
+                found = True
+                print(f"  - {name}: unreachable, all extensions are taken by "
+                      f"{', '.join(sorted(set(shadowed.values())))}")
+            elif shadowed:
+                found = True
+                names = ', '.join(sorted(ext or "''" for ext in shadowed))
+                print(f"  - {name}: {len(shadowed)} of {len(set(extensions))} extensions never reach it ({names})")
+            
+            # Only an unconditional move takes the file away from later rules
+            if extension_only and moves_out_of(rule, locations):
+                for loc in locations:
+                    for ext in extensions:
+                        claimed[loc].setdefault(ext, name)
+    if not found:
+        print("  (none)")
+    
+    # Walk cost per location
+    print("\nLocation passes:")
+    for location, names in location_index.items():
+        print(f"  - {location}: walked by {len(names)} rules")
+        path = os.path.expanduser(location)
+        if sample <= 0:
+            continue
+        if not os.path.isdir(path):
+            print("      (not available for sampling)")
+            continue
+        seen, estimated, per_entry, complete = sample_location(path, sample)
+        prefix = '' if complete else '~'
+        print(f"      Entries: {prefix}{estimated:,} (sampled {seen:,}, {per_entry * 1e6:.1f} µs per entry)")
+        print(f"      Estimated walk/stat cost: {prefix}{estimated * per_entry:.2f} s per pass, "
+              f"{prefix}{estimated * per_entry * len(names):.2f} s for all {len(names)} passes")
+
+
+def check_config(config, sample=0):
+    """Display the current configuration without making changes."""
+    print("\nCurrent Configuration:")
+    
+    # Find representative source directories
+    source_examples = set()
+    for rule in config.get('rules', []):
+        if 'locations' in rule:
+            if isinstance(rule['locations'], list):
+                for loc in rule['locations']:
+                    if isinstance(loc, dict) and 'path' in loc:
+                        source_examples.add(loc['path'])
+                    elif isinstance(loc, str):
+                        source_examples.add(loc)
+            elif isinstance(rule['locations'], str):
+                source_examples.add(rule['locations'])
+    
+    if source_examples:
+        print(f"Source directories: {', '.join(source_examples)}")
+        devices = group_by_device(sorted(source_examples))
+        if len(devices) > 1:
+            # organize_plan.py applies the actions of each device with its own worker pool
+            print(f"Source devices: {len(devices)}")
+            for device, paths in devices.items():
+                print(f"  {device if device is not None else 'unknown'}: {', '.join(paths)}")
+    
+    # Display complete directory structure
+    display_directory_structure(config)
+    
+    # Report overlapping and unreachable rules
+    analyze_rules(config, sample=sample)
+
+
+def benchmark_destination_rewrite(config, rule_count, dest_base='/benchmark/base'):
+    """Time destination rewriting on a configuration generated from the rules of config."""
+    template_rules = [rule for rule in config.get('rules', [])
+                      if any(isinstance(a, dict) and 'move' in a for a in rule.get('actions', []))]
+    if not template_rules:
+        print("Error: The configuration has no move actions to benchmark")
+        sys.exit(1)
+    
+    generated = {'rules': [copy.deepcopy(template_rules[i % len(template_rules)])
+                           for i in range(rule_count)]}
+    
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        update_destination_base(generated, dest_base)
+    elapsed = time.perf_counter() - start
+    
+    print(f"\nDestination rewrite benchmark ({rule_count} rules):")
+    print(f"  Total time: {elapsed * 1000:.1f} ms")
+    print(f"  Per rule:   {elapsed / rule_count * 1e6:.2f} µs")
+    print(f"  Throughput: {rule_count / elapsed:,.0f} rules/s")
 
 
 def interactive_mode():
@@ -417,9 +727,9 @@ def interactive_mode():
     # Ask for source directory
     update_source = input("\nDo you want to update source directories? (y/n): ").lower()
     if update_source == 'y':
-        source_dir = input("Enter new source directory path: ").strip()
-        source_dir = os.path.expanduser(source_dir)
-        config = update_source_directories(config, source_dir)
+        source_dirs = input(f"Enter new source directory path(s), separated by '{os.pathsep}': ").strip()
+        source_dirs = [os.path.expanduser(path.strip()) for path in source_dirs.split(os.pathsep) if path.strip()]
+        config = update_source_directories(config, source_dirs)
     
     # Ask for destination base
     update_dest = input("\nDo you want to update destination directories? (y/n): ").lower()
@@ -441,14 +751,27 @@ def main():
     parser = argparse.ArgumentParser(description='Customize organize-tool configuration')
     parser.add_argument('--config', '-c', default='organize.yaml',
                         help='Path to the configuration file (default: organize.yaml)')
-    parser.add_argument('--source', '-s', 
-                        help='Source directory to scan for files')
+    parser.add_argument('--source', '-s', nargs='+', action='extend', metavar='DIR',
+                        help='Source directory to scan for files; give several (e.g. NAS share, '
+                             'USB disk, local SSD) to scan them all')
     parser.add_argument('--dest-base', '-d',
                         help='Base destination directory for organized files')
     parser.add_argument('--interactive', '-i', action='store_true',
                         help='Run in interactive mode')
     parser.add_argument('--check', action='store_true',
                         help='Check the current configuration without making changes')
+    parser.add_argument('--fanout', '-f', action='append', metavar='CATEGORY=MODE',
+                        help='Fan out a destination into subdirectories, e.g. Organized/Other=hash, '
+                             'Cleanup/Duplicates=date:exif or Organized/Other=bucket:10000 '
+                             '(use MODE none to remove; may be given multiple times)')
+    parser.add_argument('--sample', type=int, default=2000, metavar='ENTRIES',
+                        help='With --check, sample up to this many entries per location to estimate '
+                             'the walk cost (default: 2000, 0 to skip)')
+    parser.add_argument('--batch', '-b', nargs='+', metavar='CONFIG',
+                        help='Apply the same changes (or --check) to several configuration files in one run')
+    parser.add_argument('--benchmark', type=int, metavar='RULES',
+                        help='Measure the per-rule cost of --dest-base rewriting on a generated '
+                             'configuration with this many rules')
     
     args = parser.parse_args()
     
@@ -460,58 +783,55 @@ def main():
     # Get the directory where this script is located
     script_dir = os.path.dirname(os.path.abspath(__file__))
     
-    # Resolve the config path
-    if not os.path.isabs(args.config):
-        config_path = os.path.join(script_dir, args.config)
-    else:
-        config_path = args.config
+    # Resolve the config paths
+    config_paths = []
+    for path in args.batch or [args.config]:
+        if not os.path.isabs(path):
+            path = os.path.join(script_dir, path)
+        config_paths.append(path)
     
-    # Load the configuration
-    config = load_config(config_path)
+    # Benchmark mode - time the rewrite on a generated configuration
+    if args.benchmark:
+        benchmark_destination_rewrite(load_config(config_paths[0]), args.benchmark)
+        return
     
     # Check mode - just display current configuration
     if args.check:
-        print("\nCurrent Configuration:")
-        
-        # Find representative source directories
-        source_examples = set()
-        for rule in config.get('rules', []):
-            if 'locations' in rule:
-                if isinstance(rule['locations'], list):
-                    for loc in rule['locations']:
-                        if isinstance(loc, dict) and 'path' in loc:
-                            source_examples.add(loc['path'])
-                        elif isinstance(loc, str):
-                            source_examples.add(loc)
-                elif isinstance(rule['locations'], str):
-                    source_examples.add(rule['locations'])
-        
-        if source_examples:
-            print(f"Source directories: {', '.join(source_examples)}")
-        
-        # Display complete directory structure
-        display_directory_structure(config)
-        
+        for config_path in config_paths:
+            if len(config_paths) > 1:
+                print(f"\n=== {config_path} ===")
+            check_config(load_config(config_path), sample=args.sample)
         return
     
-    # Update source directories if specified
-    if args.source:
-        source_dir = os.path.expanduser(args.source)
-        config = update_source_directories(config, source_dir)
-    
-    # Update destination base if specified
-    if args.dest_base:
-        dest_base = os.path.expanduser(args.dest_base)
-        config = update_destination_base(config, dest_base)
-    
-    # Save the updated configuration
-    if args.source or args.dest_base:
-        save_config(config, config_path)
-    else:
-        print("No changes specified. Use --source or --dest-base to update directories.")
+    if not (args.source or args.dest_base or args.fanout):
+        print("No changes specified. Use --source, --dest-base or --fanout to update directories.")
         print("Example: python customize_config.py --source ~/Documents --dest-base ~/Sorted")
         print("Or use --interactive/-i for interactive mode.")
         print("Use --check to view current configuration.")
+        return
+    
+    # The destination index only depends on the base, build it once for all files
+    index = DestinationIndex(os.path.expanduser(args.dest_base)) if args.dest_base else None
+    
+    for config_path in config_paths:
+        # Load the configuration
+        config = load_config(config_path)
+        
+        # Update source directories if specified
+        if args.source:
+            source_dirs = [os.path.expanduser(path) for path in args.source]
+            config = update_source_directories(config, source_dirs)
+        
+        # Update destination base if specified
+        if index is not None:
+            config = update_destination_base(config, index.dest_base, index)
+        
+        # Update fan-out layouts if specified
+        if args.fanout:
+            config = update_layout(config, args.fanout)
+        
+        # Save the updated configuration
+        save_config(config, config_path)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+dedupe.py - Reclaim the space of duplicate files with reflinks or hardlinks
+
+The duplicate rules in organize.yaml move every extra copy into
+Cleanup/Duplicates/, which frees nothing until somebody deletes them and copies
+the bytes again when the destination is on another device. This script replaces
+verified duplicates in place with a reflink (FICLONE, on Btrfs, XFS, ...) or a
+hardlink to the kept original instead, so the space is reclaimed immediately at
+almost no I/O cost.
+
+Detection narrows the candidates step by step:
+1. files of the same size on the same device
+2. same SHA-256 of the first and last 64 KiB
+3. same SHA-256 of the whole content
+4. byte-by-byte comparison with the original right before replacing
+
+The oldest file (by creation time, like `detect_original_by: created`) is kept
+as the original. Each duplicate is replaced atomically (link to a temporary
+name, then rename over the duplicate) and recorded in a JSON lines manifest,
+which --undo uses to turn the links back into independent copies.
+
+Usage:
+    # Show what would be deduplicated
+    python dedupe.py /path/to/files --dry-run
+
+    # Deduplicate with reflinks where supported, hardlinks otherwise
+    python dedupe.py /path/to/files --manifest dedupe.jsonl
+
+    # Only use hardlinks, take the file list from an inventory
+    python dedupe.py /path/to/files --mode hardlink --inventory files.inventory --manifest dedupe.jsonl
+
+    # Turn the links recorded in a manifest back into independent copies
+    python dedupe.py --undo dedupe.jsonl
+"""
+
+import os
+import sys
+import json
+import errno
+import fcntl
+import shutil
+import hashlib
+import argparse
+import datetime
+import logging
+from collections import defaultdict
+
+from io_scheduler import DEFAULT_MAX_WORKERS, IOScheduler, add_io_arguments, scheduler_from_args
+
+# Constants
+MANIFEST_VERSION = 1
+PARTIAL_BYTES = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_MIN_SIZE = 4096
+# ioctl request of Linux FICLONE (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+MODES = ('auto', 'reflink', 'hardlink')
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Replace duplicate files with reflinks or hardlinks to one original',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('locations', nargs='*', help='Directories to deduplicate')
+    parser.add_argument('--mode', '-m', choices=MODES, default='auto',
+                        help='reflink, hardlink, or auto: reflink where supported, else hardlink (default: auto)')
+    parser.add_argument('--manifest', default='dedupe-manifest.jsonl',
+                        help='Manifest recording every replacement (default: dedupe-manifest.jsonl)')
+    parser.add_argument('--dry-run', '-n', action='store_true',
+                        help='Only report the duplicates and the space that would be reclaimed')
+    parser.add_argument('--min-size', type=int, default=DEFAULT_MIN_SIZE,
+                        help=f'Ignore files smaller than this many bytes (default: {DEFAULT_MIN_SIZE})')
+    parser.add_argument('--inventory', '-i',
+                        help='Inventory written by inventory.py to take the files from')
+    parser.add_argument('--workers', '-w', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f'Maximum number of concurrent reads (default: {DEFAULT_MAX_WORKERS})')
+    parser.add_argument('--undo', metavar='MANIFEST',
+                        help='Replace the links recorded in MANIFEST with independent copies')
+    add_io_arguments(parser)
+    return parser.parse_args()
+
+
+def created_time(st):
+    """Creation time where the platform records it, else the modification time"""
+    return getattr(st, 'st_birthtime', None) or st.st_mtime
+
+
+def partial_hash(path):
+    """SHA-256 of the first and last PARTIAL_BYTES of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        digest.update(file.read(PARTIAL_BYTES))
+        size = os.fstat(file.fileno()).st_size
+        if size > PARTIAL_BYTES:
+            file.seek(max(PARTIAL_BYTES, size - PARTIAL_BYTES))
+            digest.update(file.read(PARTIAL_BYTES))
+    return digest.hexdigest()
+
+
+def full_hash(path):
+    """SHA-256 of the whole file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def same_content(path1, path2):
+    """Compare two files byte by byte"""
+    with open(path1, 'rb') as file1, open(path2, 'rb') as file2:
+        while True:
+            chunk1 = file1.read(CHUNK_SIZE)
+            if chunk1 != file2.read(CHUNK_SIZE):
+                return False
+            if not chunk1:
+                return True
+
+
+def list_files(locations, inventory_path=None, min_size=DEFAULT_MIN_SIZE):
+    """Return [(path, size)] of the regular files of at least min_size bytes"""
+    files = []
+    if inventory_path:
+        from inventory import Inventory
+        inventory = Inventory.load(inventory_path)
+        for location in locations:
+            files.extend((path, size) for path, size, _, _, _ in inventory.rows(directory=location)
+                         if size >= min_size)
+        return files
+
+    for location in locations:
+        for root, _, names in os.walk(location):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    continue
+                if os.path.isfile(path) and not os.path.islink(path) and st.st_size >= min_size:
+                    files.append((path, st.st_size))
+    return files
+
+
+def hash_groups(groups, hash_func, scheduler):
+    """Split each group of paths by hash_func, keeping only subgroups with more than one path"""
+    paths = [path for group in groups for path in group]
+    sizes = {path: size for group in groups for path, size in group.items()}
+    nbytes = (lambda path: min(sizes[path], 2 * PARTIAL_BYTES)) if hash_func is partial_hash else sizes.get
+
+    def safe_hash(path):
+        try:
+            return hash_func(path)
+        except OSError as e:
+            logger.warning(f"Could not read {path}: {e}")
+            return None
+
+    digests = dict(zip(paths, scheduler.map(safe_hash, paths, nbytes=nbytes)))
+    result = []
+    for group in groups:
+        by_digest = defaultdict(dict)
+        for path, size in group.items():
+            if digests[path] is not None:
+                by_digest[digests[path]][path] = size
+        result.extend(subgroup for subgroup in by_digest.values() if len(subgroup) > 1)
+    return result, digests
+
+
+def find_duplicates(files, scheduler):
+    """
+    Group files with identical content.
+    Returns a list of (sha256, original, [duplicates]) with paths on one device,
+    hardlinks of the same inode counted once.
+    """
+    by_size = defaultdict(list)
+    for path, size in files:
+        by_size[size].append(path)
+
+    groups = []
+    for size, paths in by_size.items():
+        if len(paths) < 2:
+            continue
+        by_device = defaultdict(dict)
+        inodes = set()
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            # Already hardlinked copies share their blocks
+            if (st.st_dev, st.st_ino) in inodes:
+                continue
+            inodes.add((st.st_dev, st.st_ino))
+            by_device[st.st_dev][path] = size
+        groups.extend(group for group in by_device.values() if len(group) > 1)
+
+    logger.info(f"{sum(len(g) for g in groups)} files in {len(groups)} groups share a size")
+    groups, _ = hash_groups(groups, partial_hash, scheduler)
+    logger.info(f"{sum(len(g) for g in groups)} files in {len(groups)} groups share the partial hash")
+    groups, digests = hash_groups(groups, full_hash, scheduler)
+
+    duplicates = []
+    for group in groups:
+        created = {}
+        for path in group:
+            try:
+                created[path] = created_time(os.stat(path))
+            except OSError as e:
+                logger.warning(f"Skipping {path}: {e}")
+        if len(created) < 2:
+            continue
+        ordered = sorted(created, key=lambda path: (created[path], path))
+        duplicates.append((digests[ordered[0]], ordered[0], ordered[1:]))
+    return duplicates
+
+
+def reflink(source, dest):
+    """Create dest as a reflink (shared extents) of source"""
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def temp_name(path):
+    """Temporary name next to path for the atomic replacement"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.dedupe-{os.getpid()}")
+
+
+def replace_with_link(original, duplicate, mode):
+    """
+    Atomically replace duplicate with a reflink or hardlink to original.
+    Returns the method used ('reflink' or 'hardlink').
+    """
+    st = os.stat(duplicate)
+    tmp_path = temp_name(duplicate)
+    try:
+        method = 'hardlink'
+        if mode in ('auto', 'reflink'):
+            try:
+                reflink(original, tmp_path)
+                method = 'reflink'
+            except OSError as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                if mode == 'reflink' or e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV,
+                                                        errno.EINVAL, errno.ENOSYS):
+                    raise
+        if method == 'hardlink':
+            os.link(original, tmp_path)
+        else:
+            # A reflink is a file of its own, so it can keep the duplicate's metadata
+            shutil.copystat(duplicate, tmp_path)
+            if os.geteuid() == 0:
+                os.chown(tmp_path, st.st_uid, st.st_gid)
+        os.replace(tmp_path, duplicate)
+        return method
+    except BaseException:
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def copy_with_hash(source, dest):
+    """Copy source to a new file dest and return the SHA-256 of the bytes written"""
+    digest = hashlib.sha256()
+    with open(source, 'rb') as src, open(dest, 'xb') as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            dst.write(chunk)
+        dst.flush()
+        os.fsync(dst.fileno())
+    return digest.hexdigest()
+
+
+def still_linked(st, original):
+    """Check whether a deduplicated hardlink still shares its inode with another name"""
+    try:
+        original_st = os.stat(original)
+        if (original_st.st_dev, original_st.st_ino) == (st.st_dev, st.st_ino):
+            return True
+    except OSError:
+        # The original may have been moved or renamed since; its inode still counts
+        pass
+    return st.st_nlink > 1
+
+
+def deduplicate(locations, mode='auto', manifest_path=None, dry_run=False, min_size=DEFAULT_MIN_SIZE,
+                inventory_path=None, scheduler=None):
+    """Find duplicates below the locations and replace them with links to their originals"""
+    scheduler = scheduler or IOScheduler()
+    files = list_files(locations, inventory_path, min_size)
+    logger.info(f"Checking {len(files)} files for duplicates")
+    duplicates = find_duplicates(files, scheduler)
+
+    # Statistics
+    stats = {
+        'groups': len(duplicates),
+        'duplicates': sum(len(dups) for _, _, dups in duplicates),
+        'replaced': 0,
+        'reflink': 0,
+        'hardlink': 0,
+        'changed': 0,
+        'error': 0,
+        'bytes': 0,
+    }
+
+    manifest = None
+    if not dry_run:
+        manifest = open(manifest_path, 'a')
+        manifest.write(json.dumps({
+            'type': 'dedupe',
+            'version': MANIFEST_VERSION,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'mode': mode,
+            'locations': [os.path.abspath(location) for location in locations],
+        }) + '\n')
+
+    try:
+        for digest, original, dups in duplicates:
+            for duplicate in dups:
+                try:
+                    st = os.stat(duplicate)
+                    if dry_run:
+                        logger.info(f"Would link: {duplicate} → {original}")
+                        stats['bytes'] += st.st_size
+                        continue
+
+                    if not scheduler.call(same_content, original, duplicate, nbytes=2 * st.st_size):
+                        logger.warning(f"Skipping {duplicate}: no longer identical to {original}")
+                        stats['changed'] += 1
+                        continue
+                    method = scheduler.call(replace_with_link, original, duplicate, mode)
+                    manifest.write(json.dumps({
+                        'type': 'link',
+                        'path': os.path.abspath(duplicate),
+                        'original': os.path.abspath(original),
+                        'method': method,
+                        'sha256': digest,
+                        'size': st.st_size,
+                        'mode': st.st_mode,
+                        'mtime_ns': st.st_mtime_ns,
+                    }) + '\n')
+                    manifest.flush()
+                    logger.info(f"{method.capitalize()}: {duplicate} → {original}")
+                    stats['replaced'] += 1
+                    stats[method] += 1
+                    stats['bytes'] += st.st_size
+                except Exception as e:
+                    logger.error(f"Failed to deduplicate {duplicate}: {e}")
+                    stats['error'] += 1
+    finally:
+        if manifest:
+            manifest.close()
+
+    # Print summary
+    logger.info("\nSummary:")
+    logger.info(f"  Duplicate groups: {stats['groups']}")
+    logger.info(f"  Duplicates: {stats['duplicates']}")
+    if dry_run:
+        logger.info(f"  Space that would be reclaimed: {stats['bytes'] / 1e9:.2f} GB")
+        logger.info("\nThis was a dry run. No files were changed.")
+    else:
+        logger.info(f"  Replaced: {stats['replaced']} ({stats['reflink']} reflinks, {stats['hardlink']} hardlinks)")
+        logger.info(f"  Skipped (changed): {stats['changed']}")
+        logger.info(f"  Errors: {stats['error']}")
+        logger.info(f"  Space reclaimed: {stats['bytes'] / 1e9:.2f} GB")
+        logger.info(f"  Manifest: {manifest_path}")
+        logger.info(f"  I/O: {scheduler.summary()}")
+    return stats
+
+
+def undo(manifest_path, scheduler=None):
+    """
+    Turn every link recorded in a manifest back into an independent file.
+    Each link is copied from its own path, which unshares the blocks without
+    depending on the original, and the copy must still have the recorded
+    SHA-256 before it replaces the link.
+    """
+    scheduler = scheduler or IOScheduler()
+    with open(manifest_path, 'r') as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+    entries = [entry for entry in entries if entry.get('type') == 'link']
+
+    stats = {'restored': 0, 'skipped': 0, 'error': 0}
+    for entry in reversed(entries):
+        path, original = entry['path'], entry['original']
+        try:
+            st = os.stat(path)
+            if entry['method'] == 'hardlink' and not still_linked(st, original):
+                logger.info(f"Skipping {path}: no longer linked to {original}")
+                stats['skipped'] += 1
+                continue
+            if st.st_size != entry['size']:
+                logger.info(f"Skipping {path}: changed since it was deduplicated")
+                stats['skipped'] += 1
+                continue
+
+            tmp_path = temp_name(path)
+            try:
+                digest = scheduler.call(copy_with_hash, path, tmp_path, nbytes=2 * entry['size'])
+                if digest != entry['sha256']:
+                    logger.info(f"Skipping {path}: changed since it was deduplicated")
+                    stats['skipped'] += 1
+                    continue
+                os.chmod(tmp_path, entry['mode'] & 0o7777)
+                os.utime(tmp_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.lexists(tmp_path):
+                    os.remove(tmp_path)
+            logger.info(f"Restored: {path}")
+            stats['restored'] += 1
+        except Exception as e:
+            logger.error(f"Failed to restore {path}: {e}")
+            stats['error'] += 1
+
+    logger.info("\nSummary:")
+    logger.info(f"  Restored: {stats['restored']}")
+    logger.info(f"  Skipped: {stats['skipped']}")
+    logger.info(f"  Errors: {stats['error']}")
+    return stats
+
+
+def main():
+    """Main entry point"""
+    args = parse_arguments()
+    scheduler = scheduler_from_args(args, max_workers=args.workers)
+
+    try:
+        if args.undo:
+            stats = undo(args.undo, scheduler)
+            return 1 if stats['error'] else 0
+
+        if not args.locations:
+            logger.error("No locations given")
+            return 1
+        for location in args.locations:
+            if not os.path.isdir(location):
+                logger.error(f"Location does not exist: {location}")
+                return 1
+
+        stats = deduplicate(args.locations, mode=args.mode, manifest_path=args.manifest, dry_run=args.dry_run,
+                            min_size=args.min_size, inventory_path=args.inventory, scheduler=scheduler)
+        return 1 if stats['error'] else 0
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
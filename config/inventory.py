@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+inventory.py - Build a shared file inventory with one parallel scan
+
+rename_photos_exif.py, the content sniffer and every organize.yaml rule used to
+rediscover the same files by walking the tree again. This script walks a
+location once with several threads and stores path, size, mtime, inode and
+extension of every file in a compact columnar format, together with per-extension
+counts and sizes. The other tools can then take their candidate lists from the
+inventory instead of walking the tree.
+
+Formats:
+- a directory (default): one array-backed binary file per column plus meta.json
+- a Parquet file (when the output ends in .parquet and pyarrow is installed)
+
+Usage:
+    # Scan a location
+    python inventory.py scan /path/to/files --out files.inventory
+
+    # Show the per-extension summary of an inventory
+    python inventory.py show files.inventory
+
+    # Use it in the other tools
+    python rename_photos_exif.py /path/to/files --recursive --inventory files.inventory
+    python sniff.py /path/to/files --inventory files.inventory
+"""
+
+import os
+import sys
+import json
+import array
+import argparse
+import datetime
+from pathlib import Path
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from io_scheduler import IOScheduler, add_io_arguments, scheduler_from_args
+
+# Constants
+INVENTORY_VERSION = 1
+DEFAULT_WORKERS = 8
+# Column name -> array typecode of the array-backed format
+COLUMNS = {
+    'dir': 'L',
+    'size': 'Q',
+    'mtime_ns': 'q',
+    'inode': 'Q',
+    'ext': 'L',
+}
+
+
+def file_extension(name):
+    """Lowercase extension without the dot, the way organize-tool's extension filter sees it"""
+    return os.path.splitext(name)[1][1:].lower()
+
+
+def scan_directory(directory):
+    """List one directory: returns (directory, [(name, size, mtime_ns, inode)], [subdirectories])"""
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        files.append((entry.name, st.st_size, st.st_mtime_ns, entry.inode()))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return directory, files, subdirs
+
+
+class Inventory:
+    """Column store of the files below one location"""
+
+    def __init__(self, location, dirs=None, extensions=None, columns=None, names=None, created=None):
+        self.location = location
+        self.dirs = dirs or []
+        self.extensions = extensions or []
+        self.columns = columns or {column: array.array(code) for column, code in COLUMNS.items()}
+        self.names = names or []
+        self.created = created or datetime.datetime.now().isoformat(timespec='seconds')
+        self._ext_ids = {ext: i for i, ext in enumerate(self.extensions)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_directory(self, directory, files):
+        """Append the files of one directory"""
+        dir_id = len(self.dirs)
+        self.dirs.append(directory)
+        columns = self.columns
+        for name, size, mtime_ns, inode in files:
+            ext = file_extension(name)
+            ext_id = self._ext_ids.get(ext)
+            if ext_id is None:
+                ext_id = self._ext_ids[ext] = len(self.extensions)
+                self.extensions.append(ext)
+            self.names.append(name)
+            columns['dir'].append(dir_id)
+            columns['size'].append(size)
+            columns['mtime_ns'].append(mtime_ns)
+            columns['inode'].append(inode)
+            columns['ext'].append(ext_id)
+
+    def rows(self, extensions=None, directory=None, recursive=True):
+        """
+        Yield (path, size, mtime_ns, inode, extension) for the selected files.
+        extensions: iterable of extensions (without dot) to include, None for all
+        directory: only files in (or below, if recursive) this directory
+        """
+        wanted = None
+        if extensions is not None:
+            wanted = {self._ext_ids[e.lstrip('.').lower()] for e in extensions
+                      if e.lstrip('.').lower() in self._ext_ids}
+        dir_ok = None
+        if directory is not None:
+            directory = os.path.normpath(os.path.abspath(directory))
+            prefix = directory.rstrip(os.sep) + os.sep
+            dir_ok = [d == directory or (recursive and d.startswith(prefix)) for d in self.dirs]
+
+        columns = self.columns
+        for i, name in enumerate(self.names):
+            ext_id = columns['ext'][i]
+            if wanted is not None and ext_id not in wanted:
+                continue
+            dir_id = columns['dir'][i]
+            if dir_ok is not None and not dir_ok[dir_id]:
+                continue
+            yield (os.path.join(self.dirs[dir_id], name), columns['size'][i],
+                   columns['mtime_ns'][i], columns['inode'][i], self.extensions[ext_id])
+
+    def paths(self, extensions=None, directory=None, recursive=True):
+        """Return the paths of the selected files"""
+        return [row[0] for row in self.rows(extensions, directory, recursive)]
+
+    def extension_summary(self):
+        """Return {extension: (count, total size)}"""
+        counts = [0] * len(self.extensions)
+        sizes = [0] * len(self.extensions)
+        for ext_id, size in zip(self.columns['ext'], self.columns['size']):
+            counts[ext_id] += 1
+            sizes[ext_id] += size
+        return {ext: (counts[i], sizes[i]) for i, ext in enumerate(self.extensions)}
+
+    def save(self, path):
+        """Write the inventory (Parquet if the path ends in .parquet, else a column directory)"""
+        path = Path(path)
+        if path.suffix == '.parquet':
+            self._save_parquet(path)
+            return
+
+        path.mkdir(parents=True, exist_ok=True)
+        for column, values in self.columns.items():
+            with open(path / f"{column}.bin", 'wb') as file:
+                values.tofile(file)
+        with open(path / 'names.bin', 'wb') as file:
+            file.write(b'\0'.join(os.fsencode(name) for name in self.names))
+        with open(path / 'dirs.bin', 'wb') as file:
+            file.write(b'\0'.join(os.fsencode(d) for d in self.dirs))
+        with open(path / 'meta.json', 'w') as file:
+            json.dump(self._meta(), file, indent=2)
+
+    def _meta(self):
+        summary = self.extension_summary()
+        return {
+            'version': INVENTORY_VERSION,
+            'location': self.location,
+            'created': self.created,
+            'files': len(self),
+            'bytes': sum(size for _, size in summary.values()),
+            'extensions': self.extensions,
+            'itemsizes': {column: values.itemsize for column, values in self.columns.items()},
+            'summary': {ext: {'count': count, 'bytes': size} for ext, (count, size) in summary.items()},
+        }
+
+    def _save_parquet(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({
+            'dir': pa.DictionaryArray.from_arrays(pa.array(self.columns['dir'], pa.uint32()), pa.array(self.dirs)),
+            'name': pa.array(self.names),
+            'size': pa.array(self.columns['size'], pa.uint64()),
+            'mtime_ns': pa.array(self.columns['mtime_ns'], pa.int64()),
+            'inode': pa.array(self.columns['inode'], pa.uint64()),
+            'extension': pa.DictionaryArray.from_arrays(pa.array(self.columns['ext'], pa.uint32()),
+                                                        pa.array(self.extensions)),
+        })
+        meta = {key: value for key, value in self._meta().items() if key in ('version', 'location', 'created')}
+        table = table.replace_schema_metadata({'inventory': json.dumps(meta)})
+        pq.write_table(table, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an inventory written by save()"""
+        path = Path(path)
+        if path.suffix == '.parquet':
+            return cls._load_parquet(path)
+
+        with open(path / 'meta.json', 'r') as file:
+            meta = json.load(file)
+        if meta.get('version') != INVENTORY_VERSION:
+            raise ValueError(f"Unsupported inventory version {meta.get('version')} in {path}")
+
+        columns = {}
+        for column, code in COLUMNS.items():
+            values = array.array(code)
+            if values.itemsize != meta['itemsizes'][column]:
+                raise ValueError(f"Inventory {path} was written on a platform with a different {column} width")
+            with open(path / f"{column}.bin", 'rb') as file:
+                values.frombytes(file.read())
+            columns[column] = values
+
+        def read_strings(name):
+            data = (path / name).read_bytes()
+            return [os.fsdecode(item) for item in data.split(b'\0')] if data else []
+
+        return cls(meta['location'], dirs=read_strings('dirs.bin'), extensions=meta['extensions'],
+                   columns=columns, names=read_strings('names.bin'), created=meta.get('created'))
+
+    @classmethod
+    def _load_parquet(cls, path):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[b'inventory'])
+        dirs = table.column('dir').combine_chunks()
+        exts = table.column('extension').combine_chunks()
+        columns = {
+            'dir': array.array('L', dirs.indices.to_pylist()),
+            'size': array.array('Q', table.column('size').to_pylist()),
+            'mtime_ns': array.array('q', table.column('mtime_ns').to_pylist()),
+            'inode': array.array('Q', table.column('inode').to_pylist()),
+            'ext': array.array('L', exts.indices.to_pylist()),
+        }
+        return cls(meta['location'], dirs=dirs.dictionary.to_pylist(), extensions=exts.dictionary.to_pylist(),
+                   columns=columns, names=table.column('name').to_pylist(), created=meta.get('created'))
+
+
+def scan_location(location, workers=DEFAULT_WORKERS, scheduler=None):
+    """
+    Walk a location with a pool of threads, one directory per task, and return its Inventory.
+    Every directory listing is one operation of the IOScheduler.
+    """
+    location = os.path.normpath(os.path.abspath(os.path.expanduser(location)))
+    inventory = Inventory(location)
+    scheduler = scheduler or IOScheduler(max_workers=workers)
+
+    with scheduler.executor() as executor:
+        pending = {executor.submit(scheduler.call, scan_directory, location)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory, files, subdirs = future.result()
+                inventory.add_directory(directory, files)
+                pending.update(executor.submit(scheduler.call, scan_directory, subdir) for subdir in subdirs)
+
+    return inventory
+
+
+def print_summary(inventory, top=25):
+    """Print the per-extension counts and sizes of an inventory"""
+    summary = inventory.extension_summary()
+    total = sum(size for _, size in summary.values())
+    print(f"Inventory of {inventory.location} (created {inventory.created})")
+    print(f"  Files: {len(inventory):,}")
+    print(f"  Directories: {len(inventory.dirs):,}")
+    print(f"  Total size: {total / 1e9:.2f} GB")
+    print(f"\nTop {top} extensions by count:")
+    for ext, (count, size) in sorted(summary.items(), key=lambda item: -item[1][0])[:top]:
+        print(f"  {ext or '(none)':20} {count:10,} files {size / 1e6:12,.1f} MB")
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Build and inspect columnar file inventories',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scan = subparsers.add_parser('scan', help='Scan a location and write its inventory')
+    scan.add_argument('location', help='Directory to scan')
+    scan.add_argument('--out', '-o', required=True,
+                      help='Inventory to write (a directory, or a .parquet file if pyarrow is installed)')
+    scan.add_argument('--workers', '-w', type=int, default=DEFAULT_WORKERS,
+                      help=f'Maximum number of scanning threads (default: {DEFAULT_WORKERS})')
+    add_io_arguments(scan)
+
+    show = subparsers.add_parser('show', help='Show the summary of an inventory')
+    show.add_argument('inventory', help='Inventory written by the scan command')
+    show.add_argument('--top', type=int, default=25, help='Number of extensions to list (default: 25)')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point"""
+    args = parse_arguments()
+
+    try:
+        if args.command == 'scan':
+            if not os.path.isdir(args.location):
+                print(f"Error: Location does not exist: {args.location}")
+                return 1
+            start = datetime.datetime.now()
+            scheduler = scheduler_from_args(args, max_workers=args.workers)
+            inventory = scan_location(args.location, scheduler=scheduler)
+            inventory.save(args.out)
+            elapsed = (datetime.datetime.now() - start).total_seconds()
+            print(f"Scanned {len(inventory):,} files in {len(inventory.dirs):,} directories "
+                  f"in {elapsed:.1f} s, written to {args.out}")
+            print(f"  {scheduler.summary()}")
+        else:
+            print_summary(Inventory.load(args.inventory), top=args.top)
+        return 0
+    except ImportError as e:
+        print(f"Error: {e}. Install pyarrow for Parquet inventories: pip install pyarrow")
+        return 1
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
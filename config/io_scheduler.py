@@ -0,0 +1,245 @@
+"""
+io_scheduler.py - Adaptive I/O throttling shared by the scan, read, EXIF and move stages
+
+Parallel scans and reads against a shared NAS are felt by everybody else using
+it. Every stage that touches the disk runs its operations through an
+IOScheduler, which
+
+- enforces a bytes/sec and an ops/sec budget (token buckets, 1 second burst),
+- limits the number of concurrent operations and adapts that limit to the
+  observed latency in AIMD style: while the 95th percentile latency of the last
+  window stays below the target the limit grows by one, otherwise it is halved.
+
+Jobs get as much throughput as the device gives without pushing tail latency
+past the target. Without any limits configured the scheduler only caps
+concurrency at max_workers, which is the previous behaviour.
+
+Each device should get its own scheduler (see group_by_device), so that a slow
+USB disk is throttled without holding back a fast local SSD. An operation that
+touches two devices, such as a move across file systems, runs through a
+SchedulerGroup and counts against the budgets of both.
+
+Settings come from the command line (see add_io_arguments) or from an `io`
+section in organize.yaml:
+
+    io:
+      max_bytes_per_sec: 50M
+      max_ops_per_sec: 500
+      target_latency_ms: 40
+      max_workers: 8
+"""
+
+import os
+import time
+import threading
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Constants
+DEFAULT_MAX_WORKERS = 8
+# Number of completed operations after which the concurrency limit is adjusted
+AIMD_WINDOW = 32
+SIZE_SUFFIXES = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(value):
+    """Parse a byte count such as 1048576, '512K', '50M' or '1G' (None stays None)"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = str(value).strip().upper().rstrip('B').rstrip('I')
+    suffix = text[-1] if text and text[-1] in SIZE_SUFFIXES else ''
+    number = text[:-1] if suffix else text
+    return float(number) * SIZE_SUFFIXES[suffix]
+
+
+class TokenBucket:
+    """Token bucket with a one second burst; consumers may go into debt and sleep it off"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        """Take amount tokens, sleeping as long as needed to stay within the rate"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class IOScheduler:
+    """Rate limits and adaptively bounds the concurrency of I/O operations"""
+
+    def __init__(self, max_bytes_per_sec=None, max_ops_per_sec=None, target_latency_ms=None,
+                 max_workers=DEFAULT_MAX_WORKERS, min_workers=1):
+        self.max_workers = max(1, int(max_workers))
+        self.min_workers = max(1, min(int(min_workers), self.max_workers))
+        self.target_latency = target_latency_ms / 1000.0 if target_latency_ms else None
+        self.byte_bucket = TokenBucket(parse_size(max_bytes_per_sec)) if max_bytes_per_sec else None
+        self.op_bucket = TokenBucket(max_ops_per_sec) if max_ops_per_sec else None
+
+        # Start low when adapting to latency, the limit grows while the device keeps up
+        self.limit = self.min_workers if self.target_latency else self.max_workers
+        self.active = 0
+        self.latencies = []
+        self.condition = threading.Condition()
+        self.stats = {'ops': 0, 'bytes': 0, 'increases': 0, 'decreases': 0, 'peak_limit': self.limit}
+
+    @classmethod
+    def from_settings(cls, settings=None, **overrides):
+        """Create a scheduler from an `io` settings dict, with non-None overrides taking precedence"""
+        settings = dict(settings or {})
+        settings.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(
+            max_bytes_per_sec=settings.get('max_bytes_per_sec'),
+            max_ops_per_sec=settings.get('max_ops_per_sec'),
+            target_latency_ms=settings.get('target_latency_ms'),
+            max_workers=settings.get('max_workers') or DEFAULT_MAX_WORKERS,
+        )
+
+    def acquire(self, nbytes=0):
+        """Wait for the budgets and a free concurrency slot"""
+        if self.op_bucket:
+            self.op_bucket.consume(1)
+        if self.byte_bucket and nbytes:
+            self.byte_bucket.consume(nbytes)
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, latency, nbytes=0):
+        """Free the slot and feed the observed latency into the AIMD controller"""
+        with self.condition:
+            self.active -= 1
+            self.stats['ops'] += 1
+            self.stats['bytes'] += nbytes
+            if self.target_latency:
+                self.latencies.append(latency)
+                if len(self.latencies) >= AIMD_WINDOW:
+                    self._adjust()
+            self.condition.notify_all()
+
+    def _adjust(self):
+        """Additive increase while the window's p95 latency is on target, multiplicative decrease otherwise"""
+        window = sorted(self.latencies)
+        self.latencies = []
+        p95 = window[int(len(window) * 0.95) - 1]
+        if p95 <= self.target_latency:
+            if self.limit < self.max_workers:
+                self.limit += 1
+                self.stats['increases'] += 1
+                self.stats['peak_limit'] = max(self.stats['peak_limit'], self.limit)
+        elif self.limit > self.min_workers:
+            self.limit = max(self.min_workers, self.limit // 2)
+            self.stats['decreases'] += 1
+
+    @contextmanager
+    def io(self, nbytes=0):
+        """Context manager around one I/O operation of about nbytes bytes"""
+        self.acquire(nbytes)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start, nbytes)
+
+    def call(self, func, *args, nbytes=0):
+        """Run func(*args) as one scheduled I/O operation"""
+        with self.io(nbytes):
+            return func(*args)
+
+    def executor(self):
+        """A thread pool big enough for the maximum concurrency; use call() inside the tasks"""
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def map(self, func, items, nbytes=None):
+        """
+        Like Executor.map, with every call scheduled as one I/O operation.
+        nbytes is an optional function returning the expected bytes for an item.
+        """
+        with self.executor() as executor:
+            futures = [executor.submit(self.call, func, item, nbytes=nbytes(item) if nbytes else 0)
+                       for item in items]
+            for future in futures:
+                yield future.result()
+
+    def summary(self):
+        """One line describing what the scheduler did"""
+        text = f"{self.stats['ops']} I/O ops, {self.stats['bytes'] / 1e6:.1f} MB"
+        if self.target_latency:
+            text += (f", concurrency {self.limit} (peak {self.stats['peak_limit']}, "
+                     f"{self.stats['increases']} increases, {self.stats['decreases']} decreases)")
+        return text
+
+
+class SchedulerGroup:
+    """Schedules each operation against several schedulers at once, e.g. the source and destination device"""
+
+    def __init__(self, *schedulers):
+        # A fixed acquisition order keeps concurrent groups from deadlocking
+        self.schedulers = sorted({id(scheduler): scheduler for scheduler in schedulers}.values(), key=id)
+
+    @contextmanager
+    def io(self, nbytes=0):
+        """Context manager around one I/O operation of about nbytes bytes"""
+        with ExitStack() as stack:
+            for scheduler in self.schedulers:
+                stack.enter_context(scheduler.io(nbytes))
+            yield
+
+    def call(self, func, *args, nbytes=0):
+        """Run func(*args) as one scheduled I/O operation"""
+        with self.io(nbytes):
+            return func(*args)
+
+
+def device_of(path):
+    """st_dev of the file system holding path (or its nearest existing parent), None if unknown"""
+    path = os.path.abspath(os.path.expandvars(os.path.expanduser(str(path))))
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+def group_by_device(paths):
+    """Group paths by device: {st_dev: [paths]} in their original order"""
+    groups = {}
+    for path in paths:
+        groups.setdefault(device_of(path), []).append(path)
+    return groups
+
+
+def add_io_arguments(parser):
+    """Add the I/O budget options to an argparse parser"""
+    group = parser.add_argument_group('I/O throttling')
+    group.add_argument('--max-bytes-per-sec', metavar='SIZE',
+                       help='Read/write budget, e.g. 50M (default: unlimited)')
+    group.add_argument('--max-ops-per-sec', type=float, metavar='N',
+                       help='File system operations per second (default: unlimited)')
+    group.add_argument('--target-latency-ms', type=float, metavar='MS',
+                       help='Adapt the number of concurrent operations to keep the p95 '
+                            'latency below this target (default: fixed concurrency)')
+    return group
+
+
+def scheduler_from_args(args, settings=None, max_workers=None):
+    """Create an IOScheduler from parsed arguments, falling back to an `io` settings dict"""
+    return IOScheduler.from_settings(
+        settings,
+        max_bytes_per_sec=getattr(args, 'max_bytes_per_sec', None),
+        max_ops_per_sec=getattr(args, 'max_ops_per_sec', None),
+        target_latency_ms=getattr(args, 'target_latency_ms', None),
+        max_workers=max_workers,
+    )
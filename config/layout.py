@@ -0,0 +1,162 @@
+"""
+layout.py - Fan-out destination layouts for large catch-all directories
+
+Rules such as "Handle Files With No Extension" or the duplicate rules move
+everything into a single flat directory. Once those directories hold hundreds of
+thousands of entries every conflict check and directory listing becomes slow.
+This module spreads the files of selected destinations over subdirectories.
+
+Layouts are declared in the `layout` section of organize.yaml (organize-tool
+ignores unknown top-level keys) and are applied when a plan is executed by
+organize_plan.py:
+
+    layout:
+    - dest: /path/to/Organized/Other/
+      fanout: hash          # two-level prefix from the file name: ab/cd/
+    - dest: /path/to/Cleanup/Duplicates/Images/
+      fanout: date          # YYYY/MM from the modification time ...
+      date_source: exif     # ... or from EXIF DateTimeOriginal (falls back to mtime)
+    - dest: /path/to/Cleanup/Duplicates/Other/
+      fanout: bucket        # 00000/, 00001/, ... with at most max_entries each
+      max_entries: 10000
+"""
+
+import os
+import hashlib
+import datetime
+from pathlib import Path
+
+# Constants
+FANOUT_MODES = ('hash', 'date', 'bucket')
+DATE_SOURCES = ('mtime', 'exif')
+DEFAULT_HASH_LEVELS = 2
+DEFAULT_MAX_ENTRIES = 10000
+BUCKET_DIGITS = 5
+
+
+def parse_fanout(spec):
+    """
+    Parse a fan-out specification as given on the command line.
+    Accepted forms: hash, hash:<levels>, date, date:exif, bucket, bucket:<max_entries>
+    """
+    mode, _, arg = spec.partition(':')
+    mode = mode.strip().lower()
+    if mode not in FANOUT_MODES:
+        raise ValueError(f"Unknown fan-out mode '{mode}' (expected one of: {', '.join(FANOUT_MODES)})")
+
+    entry = {'fanout': mode}
+    if mode == 'hash':
+        entry['levels'] = int(arg) if arg else DEFAULT_HASH_LEVELS
+    elif mode == 'date':
+        entry['date_source'] = arg or 'mtime'
+        if entry['date_source'] not in DATE_SOURCES:
+            raise ValueError(f"Unknown date source '{arg}' (expected one of: {', '.join(DATE_SOURCES)})")
+    else:
+        entry['max_entries'] = int(arg) if arg else DEFAULT_MAX_ENTRIES
+    return entry
+
+
+def normalize_dir(path):
+    """Normalize a destination directory for lookups (expanded, no trailing slash)"""
+    return os.path.normpath(os.path.expanduser(str(path)))
+
+
+def exif_datetime(file_path):
+    """Return the EXIF DateTimeOriginal of an image as a datetime, or None"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        with Image.open(file_path) as img:
+            # 0x8769 is the Exif IFD, 0x9003 is DateTimeOriginal
+            value = img.getexif().get_ifd(0x8769).get(0x9003)
+        if value:
+            return datetime.datetime.strptime(str(value)[:19], '%Y:%m:%d %H:%M:%S')
+    except Exception:
+        pass
+    return None
+
+
+class Layout:
+    """Maps destination paths of selected directories onto their fan-out subdirectories"""
+
+    def __init__(self, entries=None):
+        self.entries = {}
+        for entry in entries or []:
+            if entry.get('fanout') not in FANOUT_MODES:
+                raise ValueError(f"Invalid layout entry (unknown fanout): {entry}")
+            self.entries[normalize_dir(entry['dest'])] = entry
+        # Bucket directory -> [current bucket number, entries in it]
+        self._buckets = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the layout from a loaded organize.yaml configuration"""
+        return cls(config.get('layout') or [])
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def resolve(self, dest, source):
+        """
+        Return the final destination for a file that is going to dest.
+        Destinations outside the configured directories are returned unchanged.
+        """
+        dest = Path(dest)
+        entry = self.entries.get(normalize_dir(dest.parent))
+        if entry is None:
+            return dest
+
+        mode = entry['fanout']
+        if mode == 'hash':
+            subdir = self._hash_subdir(dest.name, entry.get('levels', DEFAULT_HASH_LEVELS))
+        elif mode == 'date':
+            subdir = self._date_subdir(source, entry.get('date_source', 'mtime'))
+        else:
+            subdir = self._bucket_subdir(dest.parent, entry.get('max_entries', DEFAULT_MAX_ENTRIES))
+        return dest.parent / subdir / dest.name
+
+    @staticmethod
+    def _hash_subdir(name, levels):
+        """Two hex characters per level from the MD5 of the file name"""
+        digest = hashlib.md5(name.encode('utf-8', 'surrogateescape')).hexdigest()
+        return '/'.join(digest[i * 2:i * 2 + 2] for i in range(levels))
+
+    @staticmethod
+    def _date_subdir(source, date_source):
+        """YYYY/MM from EXIF (if requested and available) or the modification time"""
+        when = exif_datetime(source) if date_source == 'exif' else None
+        if when is None:
+            when = datetime.datetime.fromtimestamp(os.stat(source).st_mtime)
+        return when.strftime('%Y/%m')
+
+    def _bucket_subdir(self, directory, max_entries):
+        """Fill numbered buckets up to max_entries, listing the directory only once"""
+        key = normalize_dir(directory)
+        state = self._buckets.get(key)
+        if state is None:
+            state = self._buckets[key] = self._scan_buckets(directory)
+
+        if state[1] >= max_entries:
+            state[0] += 1
+            state[1] = 0
+        state[1] += 1
+        return f"{state[0]:0{BUCKET_DIGITS}d}"
+
+    @staticmethod
+    def _scan_buckets(directory):
+        """Find the highest existing bucket and how many entries it already holds"""
+        try:
+            with os.scandir(directory) as entries:
+                buckets = {int(entry.name): entry.path for entry in entries
+                           if entry.name.isdigit() and entry.is_dir()}
+        except OSError:
+            buckets = {}
+        if not buckets:
+            return [0, 0]
+
+        last = max(buckets)
+        with os.scandir(buckets[last]) as entries:
+            return [last, sum(1 for _ in entries)]
@@ -19,17 +19,27 @@ show_usage() {
     echo "  -s, --simulate    Run in simulation mode (no actual changes)"
     echo "  -r, --run         Run the organization (default)"
     echo "  -c, --config      Specify a custom config file"
+    echo "  -p, --plan-out    With --simulate, record the resolved actions to a plan file"
+    echo "  -a, --apply       Execute a plan recorded with --plan-out (no rule re-evaluation)"
+    echo "  -P, --per-device  With --run, go through a plan and apply each source device's"
+    echo "                    actions with its own worker pool"
     echo "  -h, --help        Show this help message"
     echo ""
     echo "Examples:"
     echo "  $0 --simulate     # Test what would happen without making changes"
     echo "  $0 --run          # Actually organize the files"
     echo "  $0 --config /path/to/custom-config.yaml  # Use a custom config file"
+    echo "  $0 --simulate --plan-out plan.jsonl      # Simulate once and record the plan"
+    echo "  $0 --apply plan.jsonl                    # Execute the recorded plan"
+    echo "  $0 --run --per-device                    # Organize several source volumes in parallel"
 }
 
 # Default values
 MODE="run"
 CONFIG_FILE="$SCRIPT_DIR/organize.yaml"
+PLAN_OUT=""
+APPLY_PLAN=""
+PER_DEVICE=""
 
 # Parse command line arguments
 while [[ $# -gt 0 ]]; do
@@ -47,6 +57,20 @@ while [[ $# -gt 0 ]]; do
             shift
             shift
             ;;
+        -p|--plan-out)
+            PLAN_OUT="$2"
+            shift
+            shift
+            ;;
+        -a|--apply)
+            APPLY_PLAN="$2"
+            shift
+            shift
+            ;;
+        -P|--per-device)
+            PER_DEVICE="1"
+            shift
+            ;;
         -h|--help)
             show_usage
             exit 0
@@ -59,6 +83,22 @@ while [[ $# -gt 0 ]]; do
     esac
 done
 
+# Apply a recorded plan without re-evaluating the rules
+if [ -n "$APPLY_PLAN" ]; then
+    if [ ! -f "$APPLY_PLAN" ]; then
+        echo "Error: Plan file not found: $APPLY_PLAN"
+        exit 1
+    fi
+    echo "Applying plan: $APPLY_PLAN"
+    python3 "$SCRIPT_DIR/organize_plan.py" apply "$APPLY_PLAN"
+    exit $?
+fi
+
+if [ -n "$PLAN_OUT" ] && [ "$MODE" != "sim" ]; then
+    echo "Error: --plan-out can only be used together with --simulate"
+    exit 1
+fi
+
 # Check if the config file exists
 if [ ! -f "$CONFIG_FILE" ]; then
     echo "Error: Config file not found: $CONFIG_FILE"
@@ -67,13 +107,30 @@ fi
 
 # Run organize-tool with the specified mode and config file
 echo "Running organize-tool in $MODE mode with config: $CONFIG_FILE"
-organize $MODE "$CONFIG_FILE"
+if [ -n "$PLAN_OUT" ]; then
+    python3 "$SCRIPT_DIR/organize_plan.py" record "$CONFIG_FILE" --plan-out "$PLAN_OUT" || exit 1
+elif [ "$MODE" == "run" ] && { [ -n "$PER_DEVICE" ] || grep -qE '^(layout|compact):' "$CONFIG_FILE"; }; then
+    # organize-tool cannot fan out or compact destinations itself and works through
+    # the locations one after another, so run through a plan (one worker pool per device)
+    python3 "$SCRIPT_DIR/organize_plan.py" run "$CONFIG_FILE" || exit 1
+else
+    if [ "$MODE" == "run" ] && python3 "$SCRIPT_DIR/organize_plan.py" devices "$CONFIG_FILE" --multiple; then
+        echo "Note: the source locations span several devices; --per-device processes them in parallel"
+    fi
+    # Runs organize-tool with the compiled, cached configuration
+    python3 "$SCRIPT_DIR/config_cache.py" $MODE "$CONFIG_FILE" || exit 1
+fi
 
 # Display completion message
 if [ "$MODE" == "sim" ]; then
     echo ""
     echo "Simulation completed. No files were actually moved."
-    echo "To actually organize files, run: $0 --run"
+    if [ -n "$PLAN_OUT" ]; then
+        echo "Plan written to: $PLAN_OUT"
+        echo "To execute it without re-evaluating the rules, run: $0 --apply $PLAN_OUT"
+    else
+        echo "To actually organize files, run: $0 --run"
+    fi
 else
     echo ""
     echo "Organization completed successfully!"
@@ -0,0 +1,794 @@
+#!/usr/bin/env python3
+"""
+organize_plan.py - Record an organize-tool simulation as a plan and apply it later
+
+Running `organize-files.sh --simulate` and then `--run` evaluates every filter
+twice, including the expensive EXIF, duplicate and metadata filters. This script
+records the resolved actions of a single simulation run (source, action,
+destination) together with a size/mtime fingerprint of every source file, and
+can later execute that plan directly. Applying a plan only re-stats each source
+to detect files that changed since the simulation; no rules are re-evaluated.
+
+Usage:
+    # Simulate and record the plan
+    python organize_plan.py record organize.yaml --plan-out plan.jsonl
+
+    # Execute a recorded plan
+    python organize_plan.py apply plan.jsonl
+
+    # Show what applying the plan would do without touching any files
+    python organize_plan.py apply plan.jsonl --dry-run
+
+    # Simulate and apply in one go (used for configs with a `layout` or
+    # `compact` section, and by organize-files.sh --run --per-device)
+    python organize_plan.py run organize.yaml
+
+    # List the source locations by device
+    python organize_plan.py devices organize.yaml
+
+Destinations listed in the `layout` section of the configuration are fanned out
+into subdirectories when the plan is applied (see layout.py). Files matched by
+the catch-all rules are classified by their content while recording and routed
+to the rule for their actual type (see sniff.py).
+
+A plan reproduces the move, copy, rename and delete actions (echo only prints),
+and applies each action's on_conflict mode and rename_template. Recording refuses
+configurations with other actions (trash, shell, python, ...) or with
+`on_conflict: trash`, since applying the plan would silently leave them out.
+
+Actions on files from different devices are independent, so the plan is applied
+with one worker pool and I/O scheduler per source device (st_dev): a slow USB
+disk does not hold back a local SSD, and the throughput adds up. Actions on the
+same file still run in plan order.
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import datetime
+import logging
+import filecmp
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import wait
+from pathlib import Path
+
+from compact import Compactor
+from config_cache import load_yaml
+from io_scheduler import (IOScheduler, SchedulerGroup, add_io_arguments, device_of, group_by_device,
+                          scheduler_from_args)
+from layout import Layout
+from sniff import DEFAULT_SNIFF_RULES, extension_destinations, sniff_files
+
+# Constants
+PLAN_VERSION = 1
+# Same default as organize-tool's `rename_template` for on_conflict: rename_new
+RENAME_TEMPLATE = "{name} {counter}{extension}"
+# organize-tool action messages, keyed by action name
+ACTION_PREFIXES = {
+    'move': 'Move to ',
+    'copy': 'Copy to ',
+    'rename': 'Renaming to ',
+    'delete': 'Deleting ',
+}
+# Actions that only print and need nothing in the plan
+PASSIVE_ACTIONS = {'echo'}
+# Actions a plan cannot reproduce; `python` is left out because python filters
+# print under the same sender name
+UNSUPPORTED_SENDERS = {'trash', 'hardlink', 'symlink', 'shell', 'write', 'macos_tags', 'confirm'}
+# organize-tool's on_conflict modes that applying a plan can honour (not trash)
+CONFLICT_MODES = ('rename_new', 'rename_existing', 'skip', 'overwrite', 'deduplicate')
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Record organize-tool simulations as plans and apply them',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help='Simulate a config and record the plan')
+    record.add_argument('config', help='Path to the organize-tool configuration file')
+    record.add_argument('--plan-out', '-o', required=True,
+                        help='File to write the plan to (JSON lines)')
+
+    apply = subparsers.add_parser('apply', help='Execute a recorded plan')
+    apply.add_argument('plan', help='Plan file written by the record command')
+    apply.add_argument('--dry-run', '-n', action='store_true',
+                       help='Only report what would be done')
+    add_io_arguments(apply)
+
+    run = subparsers.add_parser('run', help='Simulate a config and apply the result directly')
+    run.add_argument('config', help='Path to the organize-tool configuration file')
+    add_io_arguments(run)
+
+    devices = subparsers.add_parser('devices', help='List the source locations of a config by device')
+    devices.add_argument('config', help='Path to the organize-tool configuration file')
+    devices.add_argument('--multiple', action='store_true',
+                         help='Print nothing; exit with status 0 only if the locations span several devices')
+
+    return parser.parse_args()
+
+
+def file_sha256(file_path):
+    """Return the SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path):
+    """Return the (size, mtime_ns) fingerprint of a file, or None if it is missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def run_simulation(config_path):
+    """Simulate the configuration with JSONL output and yield the decoded events"""
+    # config_cache.py runs organize-tool with the compiled, cached configuration
+    runner = Path(__file__).resolve().parent / 'config_cache.py'
+    cmd = [sys.executable, str(runner), 'sim', str(config_path), '--format', 'jsonl']
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+
+    with proc.stdout:
+        for line in proc.stdout:
+            line = line.strip()
+            if not line.startswith('{'):
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.debug(f"Ignoring malformed output line: {line}")
+
+    if proc.wait() != 0:
+        raise RuntimeError(f"The simulation exited with status {proc.returncode}")
+
+
+def parse_action(event):
+    """
+    Turn an organize-tool MSG event into a plan entry.
+    Returns None for events that do not change the file system (echo, errors, ...).
+    """
+    if event.get('type') != 'MSG' or event.get('level') != 'info':
+        return None
+
+    action = event.get('sender')
+    prefix = ACTION_PREFIXES.get(action)
+    msg = event.get('msg', '')
+    if prefix is None or not msg.startswith(prefix) or not event.get('path'):
+        return None
+
+    source = event['path']
+    target = msg[len(prefix):]
+    if action == 'rename':
+        dest = str(Path(source).with_name(target))
+    elif action == 'delete':
+        dest = None
+    else:
+        dest = target
+
+    return {
+        'type': 'action',
+        'rule_nr': event.get('rule_nr'),
+        'rule': event.get('rule_name', ''),
+        'action': action,
+        'source': source,
+        'basedir': event.get('basedir'),
+        'dest': dest,
+    }
+
+
+def action_settings(config):
+    """
+    Check that a plan can reproduce every action of the enabled rules and return
+    the settings of their file actions: {(rule_nr, action): (on_conflict,
+    rename_template, continue_with)}, with continue_with None for anything but
+    copy. Raises ValueError listing everything a plan cannot do.
+    """
+    settings = {}
+    problems = []
+    for rule_nr, rule in enumerate(config.get('rules', [])):
+        if not rule.get('enabled', True):
+            continue
+        name = rule.get('name', f"rule {rule_nr}")
+        for action in rule.get('actions') or []:
+            if isinstance(action, dict):
+                action, options = next(iter(action.items()))
+            else:
+                options = None
+            action = str(action).lower()
+            if action in PASSIVE_ACTIONS:
+                continue
+            if action not in ACTION_PREFIXES:
+                problems.append(f"{name}: unsupported action '{action}'")
+                continue
+            if action == 'delete':
+                continue
+
+            options = options if isinstance(options, dict) else {}
+            on_conflict = options.get('on_conflict', 'rename_new')
+            template = options.get('rename_template', RENAME_TEMPLATE)
+            if on_conflict not in CONFLICT_MODES:
+                problems.append(f"{name}: unsupported on_conflict '{on_conflict}' for {action}")
+                continue
+            try:
+                template.format(name='name', counter=2, extension='.ext')
+                valid = '{counter}' in template
+            except (KeyError, IndexError, ValueError):
+                valid = False
+            if not valid:
+                problems.append(f"{name}: unsupported rename_template '{template}' for {action}")
+                continue
+            # organize-tool's later actions work on the copy unless told otherwise
+            continue_with = options.get('continue_with', 'copy') if action == 'copy' else None
+            if continue_with not in (None, 'copy', 'original'):
+                problems.append(f"{name}: unsupported continue_with '{continue_with}' for copy")
+                continue
+            value = (on_conflict, template, continue_with)
+            if settings.setdefault((rule_nr, action), value) != value:
+                problems.append(f"{name}: several {action} actions with different settings")
+
+    if problems:
+        raise ValueError("A plan cannot reproduce this configuration:\n  " + "\n  ".join(problems))
+    return settings
+
+
+def route_by_content(entries, config):
+    """
+    Send the files matched by the catch-all rules to the destination of the rule
+    that handles their detected type. Returns the number of re-routed entries.
+    """
+    sniff_rules = (config.get('sniff') or {}).get('rules', DEFAULT_SNIFF_RULES)
+    candidates = [entry for entry in entries
+                  if entry['rule'] in sniff_rules and entry['action'] == 'move']
+    if not candidates:
+        return 0
+
+    destinations = extension_destinations(config, skip_rules=sniff_rules)
+    scheduler = IOScheduler.from_settings(config.get('io'))
+    detected = sniff_files({entry['source'] for entry in candidates}, scheduler=scheduler)
+
+    count = 0
+    for entry in candidates:
+        extension = detected.get(entry['source'])
+        dest_dir = destinations.get(extension)
+        if dest_dir is None:
+            continue
+        dest_dir = os.path.expandvars(os.path.expanduser(dest_dir))
+        entry['dest'] = os.path.join(dest_dir, os.path.basename(entry['source']))
+        entry['sniffed'] = extension
+        count += 1
+    return count
+
+
+def record_plan(config_path, plan_path):
+    """Simulate the configuration once and write the resolved actions to a plan file"""
+    config_path = Path(config_path).resolve()
+    config = load_yaml(config_path) or {}
+    settings = action_settings(config)
+
+    entries = []
+    # Fingerprints of paths that only exist in the simulation (e.g. the result of a
+    # rename or copy that a later action of the same rule works on)
+    simulated = {}
+    stats = {'actions': 0, 'errors': 0, 'missing': 0}
+    unsupported = {}
+
+    for event in run_simulation(config_path):
+        if event.get('type') == 'MSG' and event.get('level') == 'error':
+            stats['errors'] += 1
+            logger.warning(f"{event.get('rule_name')}: {event.get('path')}: {event.get('msg')}")
+            continue
+        if event.get('type') == 'MSG' and event.get('sender') in UNSUPPORTED_SENDERS:
+            unsupported[event['sender']] = unsupported.get(event['sender'], 0) + 1
+            continue
+
+        entry = parse_action(event)
+        if entry is None:
+            continue
+        if entry['dest'] is not None:
+            on_conflict, template, continue_with = settings.get(
+                (entry['rule_nr'], entry['action']), ('rename_new', RENAME_TEMPLATE, None))
+            entry['on_conflict'], entry['rename_template'] = on_conflict, template
+            if continue_with:
+                entry['continue_with'] = continue_with
+
+        fp = fingerprint(entry['source'])
+        if fp is None and entry['source'] in simulated:
+            # Works on the result of an earlier action of the same rule
+            fp = simulated[entry['source']]
+            entry['continues'] = True
+        if fp is None:
+            logger.warning(f"Source not found while recording: {entry['source']}")
+            stats['missing'] += 1
+            continue
+
+        entry['size'], entry['mtime_ns'] = fp
+        if continues_with_dest(entry):
+            simulated[entry['dest']] = fp
+        entries.append(entry)
+        stats['actions'] += 1
+
+    if unsupported:
+        counts = ', '.join(f"{count} {sender}" for sender, count in sorted(unsupported.items()))
+        raise RuntimeError(f"The simulation ran actions a plan cannot reproduce ({counts}); no plan was written")
+
+    routed = route_by_content(entries, config)
+
+    header = {
+        'type': 'plan',
+        'version': PLAN_VERSION,
+        'config': str(config_path),
+        'config_sha256': file_sha256(config_path),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'actions': stats['actions'],
+        'errors': stats['errors'],
+        'layout': config.get('layout') or [],
+        'io': config.get('io') or {},
+        'compact': config.get('compact') or [],
+    }
+
+    with open(plan_path, 'w') as file:
+        file.write(json.dumps(header) + '\n')
+        for entry in entries:
+            file.write(json.dumps(entry) + '\n')
+
+    logger.info(f"Recorded {stats['actions']} actions to {plan_path}")
+    if routed:
+        logger.info(f"Routed {routed} files without a usable extension by their content")
+    if stats['errors']:
+        logger.warning(f"The simulation reported {stats['errors']} errors; those files are not in the plan")
+    if stats['missing']:
+        logger.warning(f"{stats['missing']} sources disappeared during the simulation")
+    return stats
+
+
+def read_plan(plan_path):
+    """Read a plan file and return its header and list of entries"""
+    with open(plan_path, 'r') as file:
+        lines = [json.loads(line) for line in file if line.strip()]
+
+    if not lines or lines[0].get('type') != 'plan':
+        raise ValueError(f"Not a plan file: {plan_path}")
+    header = lines[0]
+    if header.get('version') != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version {header.get('version')} in {plan_path}")
+
+    return header, [line for line in lines[1:] if line.get('type') == 'action']
+
+
+def next_free_name(dst, reserved=(), template=RENAME_TEMPLATE):
+    """
+    Find a free destination name the same way organize-tool's rename_new does.
+    Names in reserved are taken by actions that are still running.
+    """
+    if not os.path.lexists(dst) and dst not in reserved:
+        return dst
+    counter = 2
+    while True:
+        candidate = dst.with_name(template.format(name=dst.stem, counter=counter, extension=dst.suffix))
+        if not os.path.lexists(candidate) and candidate not in reserved:
+            return candidate
+        counter += 1
+
+
+def resolve_conflict(source, dst, entry, reserved=None, dry_run=False):
+    """
+    Handle an existing destination according to the entry's on_conflict mode, like
+    organize-tool does. Returns the destination to use, or None to skip the action.
+    """
+    reserved = set() if reserved is None else reserved
+    if not os.path.lexists(dst) and dst not in reserved:
+        return dst
+    mode = entry.get('on_conflict', 'rename_new')
+    template = entry.get('rename_template', RENAME_TEMPLATE)
+
+    if mode == 'skip':
+        return None
+    if mode == 'overwrite':
+        return dst
+    if mode == 'deduplicate' and os.path.isfile(dst) and filecmp.cmp(source, dst, shallow=True):
+        return None
+    if mode == 'rename_existing' and os.path.lexists(dst):
+        existing = next_free_name(dst, reserved, template)
+        if dry_run:
+            logger.info(f"Would rename existing: {dst} → {existing}")
+        else:
+            os.rename(dst, existing)
+        reserved.add(existing)
+        return dst
+    return next_free_name(dst, reserved, template)
+
+
+def is_within(path, directory):
+    """Check whether path is located inside directory"""
+    if not directory:
+        return True
+    try:
+        Path(path).relative_to(directory)
+        return True
+    except ValueError:
+        return False
+
+
+def resolve_entry(entry, moved):
+    """
+    Work out where the source of an entry lives now and where it should go.
+
+    The simulation does not move anything, so a file matched by several rules shows
+    up once per rule with its original path. In a real run a later rule only sees
+    the file if an earlier action left it inside that rule's location, so such
+    entries follow the file to its new path or are dropped.
+    Returns (source, dest), or (None, None) if the file was already handled.
+    """
+    source = entry['source']
+    current = source
+    seen = set()
+    while current in moved and current not in seen:
+        seen.add(current)
+        current = moved[current]
+        if current is None:
+            # Deleted by an earlier action
+            return None, None
+
+    dest = entry['dest']
+    if current == source:
+        return Path(source), Path(dest) if dest else None
+
+    # Later actions of the same rule keep working on the file wherever it went
+    if not entry.get('continues') and not is_within(current, entry.get('basedir')):
+        return None, None
+
+    # The destination was computed from the old name; carry the new name over
+    if dest:
+        dest = Path(dest)
+        if dest.name == Path(source).name:
+            dest = dest.with_name(Path(current).name)
+        if entry['action'] == 'rename':
+            # A rename stays in the folder the file is in now
+            dest = Path(current).with_name(dest.name)
+    return Path(current), dest
+
+
+def transfer_size(action, size, source_device, dest_device):
+    """Bytes an action reads and writes: copies and moves across file systems transfer the whole file"""
+    if action == 'copy':
+        return size
+    if action != 'move':
+        return 0
+    return 0 if source_device is not None and source_device == dest_device else size
+
+
+def execute_action(action, source, dest):
+    """Perform a single file system action and return the resulting path"""
+    if action == 'delete':
+        os.remove(source)
+        return None
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if action == 'copy':
+        shutil.copy2(source, dest)
+        return source
+    if action == 'rename':
+        source.rename(dest)
+    else:
+        shutil.move(str(source), str(dest))
+    return dest
+
+
+def source_locations(config):
+    """Return the location paths of all rules, without duplicates, in config order"""
+    paths = {}
+    for rule in config.get('rules', []):
+        locations = rule.get('locations') or []
+        if not isinstance(locations, list):
+            locations = [locations]
+        for location in locations:
+            path = location.get('path') if isinstance(location, dict) else location
+            if isinstance(path, str):
+                paths[path] = True
+    return list(paths)
+
+
+def continues_with_dest(entry):
+    """Check whether the later actions of an entry's rule work on its destination"""
+    if not entry['dest']:
+        return False
+    return entry['action'] in ('move', 'rename') or entry.get('continue_with') == 'copy'
+
+
+def entry_chains(entries):
+    """
+    Split plan entries into chains of entries that act on the same file, in plan
+    order. A file renamed, moved or copied (continue_with: copy) by one entry is
+    followed by later entries under its new path. Different chains never touch
+    the same source file.
+    """
+    chain_of = {}
+    chains = {}
+    for entry in entries:
+        key = chain_of.get(entry['source'], entry['source'])
+        chains.setdefault(key, []).append(entry)
+        if continues_with_dest(entry):
+            chain_of[entry['dest']] = key
+    return chains
+
+
+class PlanExecutor:
+    """
+    Applies plan entries. Chains of entries are independent, so the chains of
+    every source device run on that device's own worker pool and I/O scheduler;
+    a slow USB disk then does not hold back a local SSD. Devices are looked up
+    once per location and destination folder, not per file, and an action that
+    writes to another device also counts against that device's scheduler.
+    """
+
+    def __init__(self, layout, compactor, make_scheduler, dry_run=False):
+        self.layout = layout
+        self.compactor = compactor
+        self.make_scheduler = make_scheduler
+        self.dry_run = dry_run
+        # Original path -> path after the action, so later entries can follow the file
+        self.moved = {}
+        # Destination names picked by actions that may still be running
+        self.reserved = set()
+        # Destination -> Event set once the action writing it has finished
+        self.writing = {}
+        # Directory -> st_dev, and st_dev -> IOScheduler
+        self.devices = {}
+        self.schedulers = {}
+        self.lock = threading.Lock()
+        self.stats = {'applied': 0, 'already_handled': 0, 'drifted': 0, 'conflict_skipped': 0, 'compacted': 0,
+                      'error': 0}
+
+    def count(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def device(self, directory):
+        """Device of a location or destination folder, looked up once"""
+        directory = str(directory)
+        if directory not in self.devices:
+            self.devices[directory] = device_of(directory)
+        return self.devices[directory]
+
+    def scheduler(self, *devices):
+        """The scheduler of a device; several devices share each operation through a SchedulerGroup"""
+        with self.lock:
+            for device in devices:
+                if device not in self.schedulers:
+                    self.schedulers[device] = self.make_scheduler()
+            if len(set(devices)) == 1:
+                return self.schedulers[devices[0]]
+            return SchedulerGroup(*(self.schedulers[device] for device in devices))
+
+    def claim(self, source, dest, entry):
+        """
+        Pick the name an action writes to according to on_conflict and mark it
+        busy until release(). An action whose destination another action is still
+        writing (on_conflict: overwrite) waits for that action to finish first.
+        Returns the destination, or None to skip the action.
+        """
+        while True:
+            with self.lock:
+                busy = self.writing.get(dest)
+                if busy is None:
+                    dest = resolve_conflict(source, dest, entry, self.reserved, self.dry_run)
+                    if dest is not None:
+                        self.reserved.add(dest)
+                        self.writing[dest] = threading.Event()
+                    return dest
+            busy.wait()
+
+    def release(self, dest):
+        """Mark a destination claimed by claim() as written"""
+        with self.lock:
+            self.writing.pop(dest).set()
+
+    def apply_entry(self, entry, device):
+        """
+        Apply one entry whose source is on device. Returns its outcome (a stats
+        key) and the device the file is on afterwards.
+        """
+        action = entry['action']
+        moved = self.moved
+        source, dest = resolve_entry(entry, moved)
+        if source is None:
+            logger.debug(f"Already handled by an earlier rule: {entry['source']}")
+            return 'already_handled', device
+
+        if fingerprint(source) != (entry['size'], entry['mtime_ns']):
+            logger.warning(f"Skipping {source}: changed or missing since the plan was recorded")
+            return 'drifted', device
+
+        # Renames stay in their folder; moves and copies go to a rule's destination
+        dest_device = self.device(dest.parent) if action in ('move', 'copy') else device
+
+        if action == 'move' and self.compactor.handles(entry['rule']):
+            # Packed into an archive in the destination folder; the source is
+            # removed when that archive is finalized
+            if self.dry_run:
+                logger.info(f"Would compact: {source} → {dest.parent}")
+            else:
+                archive = self.compactor.add(entry['rule'], source, dest.parent, entry.get('basedir'),
+                                             (entry['size'], entry['mtime_ns']),
+                                             self.scheduler(device, dest_device))
+                logger.debug(f"Compact: {source} → {archive}")
+            moved[entry['source']] = None
+            if str(source) != entry['source']:
+                moved[str(source)] = None
+            return 'compacted', device
+
+        if dest is not None:
+            if action in ('move', 'copy'):
+                with self.lock:
+                    dest = self.layout.resolve(dest, source)
+            dest = self.claim(source, dest, entry)
+            if dest is None:
+                logger.info(f"Skipping {source}: the destination exists (on_conflict: "
+                            f"{entry.get('on_conflict')})")
+                return 'conflict_skipped', device
+
+        try:
+            if self.dry_run:
+                logger.info(f"Would {action}: {source}" + (f" → {dest}" if dest else ""))
+                new_path = None if action == 'delete' else (source if action == 'copy' else dest)
+            else:
+                nbytes = transfer_size(action, entry['size'], device, dest_device)
+                scheduler = self.scheduler(device, dest_device)
+                new_path = scheduler.call(execute_action, action, source, dest, nbytes=nbytes)
+                logger.info(f"{action.capitalize()}: {source}" + (f" → {dest}" if dest else ""))
+        finally:
+            if dest is not None:
+                self.release(dest)
+
+        if new_path != source:
+            moved[entry['source']] = str(new_path) if new_path else None
+            if str(source) != entry['source']:
+                moved[str(source)] = moved[entry['source']]
+        if continues_with_dest(entry) and str(dest) != entry['dest']:
+            # Conflicts or a fan-out layout changed the destination: later actions
+            # of the rule find the file under its actual path
+            moved[entry['dest']] = str(dest)
+        return 'applied', dest_device if action == 'move' else device
+
+    def run_chain(self, chain, device):
+        """Apply the entries of one chain in order, starting on device"""
+        for entry in chain:
+            try:
+                outcome, device = self.apply_entry(entry, device)
+            except Exception as e:
+                logger.error(f"Failed to {entry['action']} {entry['source']}: {e}")
+                outcome = 'error'
+            self.count(outcome)
+
+    def run(self, entries):
+        """Apply all entries and return {device: scheduler}"""
+        # Chains are grouped by the device of the location they were found in
+        by_device = {}
+        for chain in entry_chains(entries).values():
+            basedir = chain[0].get('basedir') or os.path.dirname(chain[0]['source'])
+            by_device.setdefault(self.device(basedir), []).append(chain)
+
+        if self.dry_run:
+            for device, chains in by_device.items():
+                for chain in chains:
+                    self.run_chain(chain, device)
+            return self.schedulers
+
+        if len(by_device) > 1:
+            logger.info(f"Applying on {len(by_device)} devices with a worker pool each")
+        executors = [self.scheduler(device).executor() for device in by_device]
+        try:
+            futures = [executor.submit(self.run_chain, chain, device)
+                       for executor, (device, chains) in zip(executors, by_device.items())
+                       for chain in chains]
+            wait(futures)
+        finally:
+            for executor in executors:
+                executor.shutdown()
+        return self.schedulers
+
+
+def apply_plan(plan_path, dry_run=False, io_args=None):
+    """
+    Execute a recorded plan, skipping any source that changed since recording.
+    Actions run through an IOScheduler per source device, configured by the
+    config's `io` section and overridden by the I/O options in io_args.
+    """
+    header, entries = read_plan(plan_path)
+
+    config_path = header.get('config')
+    if config_path and os.path.exists(config_path) and file_sha256(config_path) != header.get('config_sha256'):
+        logger.warning(f"{config_path} changed since the plan was recorded")
+
+    logger.info(f"Applying {len(entries)} actions from {plan_path} (recorded {header.get('created')})")
+    layout = Layout(header.get('layout'))
+    compactor = Compactor(header.get('compact'))
+    executor = PlanExecutor(layout, compactor, lambda: scheduler_from_args(io_args, settings=header.get('io')),
+                            dry_run)
+    schedulers = executor.run(entries)
+
+    # Statistics
+    stats = dict(executor.stats, total_actions=len(entries))
+
+    if compactor and not dry_run:
+        compact_stats = compactor.close()
+        logger.info(f"Compacted {compact_stats['files']} files into {compact_stats['archives']} archives")
+        # Files whose archive was dropped are still in place
+        stats['compacted'] = compact_stats['files']
+        if compact_stats['dropped']:
+            logger.error(f"{compact_stats['dropped']} files were left in place because their archive failed")
+            stats['error'] += compact_stats['dropped']
+
+    # Print summary
+    logger.info("\nSummary:")
+    logger.info(f"  Planned actions: {stats['total_actions']}")
+    logger.info(f"  Applied: {stats['applied']}")
+    if compactor:
+        logger.info(f"  Compacted into archives: {stats['compacted']}")
+    logger.info(f"  Already handled by an earlier rule: {stats['already_handled']}")
+    logger.info(f"  Skipped (changed since simulation): {stats['drifted']}")
+    logger.info(f"  Skipped (destination exists): {stats['conflict_skipped']}")
+    logger.info(f"  Errors: {stats['error']}")
+    if not dry_run:
+        for device, scheduler in schedulers.items():
+            name = f" (device {device})" if len(schedulers) > 1 else ""
+            logger.info(f"  I/O{name}: {scheduler.summary()}")
+
+    if dry_run:
+        logger.info("\nThis was a dry run. No files were changed.")
+    return stats
+
+
+def main():
+    """Main entry point"""
+    args = parse_arguments()
+
+    try:
+        if args.command == 'record':
+            record_plan(args.config, args.plan_out)
+            return 0
+
+        if args.command == 'devices':
+            devices = group_by_device(source_locations(load_yaml(args.config)))
+            if args.multiple:
+                return 0 if len(devices) > 1 else 1
+            for device, paths in devices.items():
+                print(f"{device if device is not None else 'unknown'}: {', '.join(paths)}")
+            return 0
+
+        if args.command == 'run':
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                plan_path = os.path.join(tmp_dir, 'plan.jsonl')
+                record_plan(args.config, plan_path)
+                stats = apply_plan(plan_path, io_args=args)
+        else:
+            stats = apply_plan(args.plan, dry_run=args.dry_run, io_args=args)
+        return 1 if stats['error'] else 0
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
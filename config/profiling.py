@@ -0,0 +1,178 @@
+"""
+profiling.py - Built-in profiling for the per-file scripts
+
+When a run is slow there is no way to see where the time goes without editing
+the scripts. The scripts accept --profile, which runs them inside a Profiler
+(--profile-prefix sets PREFIX):
+
+- cProfile of the main thread, written to PREFIX.pstats
+  (inspect with `python -m pstats PREFIX.pstats` or snakeviz),
+- a sampling profiler over all threads, written as collapsed stacks to
+  PREFIX.collapsed.txt (feed to flamegraph.pl or speedscope),
+- per-file stage timings (open, parse, stat, rename); the slowest files are
+  printed at the end and written to PREFIX.slowest.txt.
+
+Without --profile the stage timer is a no-op, so the scripts keep their speed.
+"""
+
+import os
+import sys
+import time
+import heapq
+import pstats
+import cProfile
+import datetime
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Constants
+DEFAULT_TOP_FILES = 10
+SAMPLE_INTERVAL = 0.005
+STAGES = ('open', 'parse', 'stat', 'rename')
+
+
+class StageTimer:
+    """Accumulates the time spent per file and stage (thread safe)"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.timings = defaultdict(lambda: defaultdict(float))
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, file_path, name):
+        """Time one stage of one file"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.timings[str(file_path)][name] += elapsed
+
+    def slowest(self, count=DEFAULT_TOP_FILES):
+        """Return [(total, path, {stage: seconds})] for the slowest files"""
+        with self.lock:
+            items = [(sum(stages.values()), path, dict(stages)) for path, stages in self.timings.items()]
+        return heapq.nlargest(count, items, key=lambda item: item[0])
+
+    def format_slowest(self, count=DEFAULT_TOP_FILES):
+        """The slowest files as text lines, one column per stage in ms"""
+        stages = list(STAGES) + sorted({name for stages in self.timings.values() for name in stages} - set(STAGES))
+        lines = [f"{'total ms':>10} " + ' '.join(f"{name + ' ms':>10}" for name in stages) + '  file']
+        for total, path, timings in self.slowest(count):
+            lines.append(f"{total * 1000:10.2f} "
+                         + ' '.join(f"{timings.get(name, 0) * 1000:10.2f}" for name in stages)
+                         + f"  {path}")
+        return lines
+
+
+# Shared no-op timer for runs without --profile
+NO_TIMING = StageTimer(enabled=False)
+
+
+class StackSampler(threading.Thread):
+    """Samples the stacks of all other threads and counts them in collapsed form"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def write(self, path):
+        """Write the samples in the collapsed-stack format of flamegraph.pl"""
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    Context manager combining cProfile, the stack sampler and a stage timer.
+    Use profiler.timer for the per-file stage timings.
+    """
+
+    def __init__(self, prefix, top=DEFAULT_TOP_FILES):
+        self.prefix = prefix
+        self.top = top
+        self.timer = StageTimer()
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler()
+
+    def __enter__(self):
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profile.disable()
+        self.sampler.stop()
+        self.write()
+        return False
+
+    def write(self):
+        """Write the profile files and print the slowest files"""
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.profile.dump_stats(f"{self.prefix}.pstats")
+        self.sampler.write(f"{self.prefix}.collapsed.txt")
+        slowest = self.timer.format_slowest(self.top)
+        with open(f"{self.prefix}.slowest.txt", 'w') as file:
+            file.write('\n'.join(slowest) + '\n')
+
+        print(f"\nProfile written to {self.prefix}.pstats, {self.prefix}.collapsed.txt "
+              f"and {self.prefix}.slowest.txt", file=sys.stderr)
+        print("\nTop functions by cumulative time:", file=sys.stderr)
+        pstats.Stats(self.profile, stream=sys.stderr).sort_stats('cumulative').print_stats(10)
+        print(f"Slowest {self.top} files:", file=sys.stderr)
+        for line in slowest:
+            print(f"  {line}", file=sys.stderr)
+
+
+def default_prefix(script_name):
+    """Profile prefix for a script: <script>-<timestamp> in the current directory"""
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    return f"{os.path.splitext(os.path.basename(script_name))[0]}-{stamp}"
+
+
+def add_profile_arguments(parser):
+    """Add --profile, --profile-prefix and --profile-top to an argparse parser"""
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run and write PREFIX.pstats, PREFIX.collapsed.txt and PREFIX.slowest.txt')
+    parser.add_argument('--profile-prefix', metavar='PREFIX',
+                        help='Prefix of the profile files, implies --profile (default: <script>-<timestamp>)')
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_TOP_FILES, metavar='N',
+                        help=f'Number of slowest files to report (default: {DEFAULT_TOP_FILES})')
+
+
+@contextmanager
+def profile_from_args(args, script_name):
+    """Yield the StageTimer to use: a Profiler's if --profile was given, else NO_TIMING"""
+    if not (args.profile or args.profile_prefix):
+        yield NO_TIMING
+        return
+    with Profiler(args.profile_prefix or default_prefix(script_name), top=args.profile_top) as profiler:
+        yield profiler.timer
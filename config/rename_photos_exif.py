@@ -20,6 +20,15 @@ Usage:
 
     # Verbose output
     python rename_photos_exif.py /path/to/photos --verbose
+
+    # Take the candidate files from an inventory instead of walking the tree
+    python rename_photos_exif.py /path/to/photos --recursive --inventory photos.inventory
+
+    # Read EXIF data in parallel, but stay gentle on a shared NAS
+    python rename_photos_exif.py /path/to/photos --recursive --max-ops-per-sec 200 --target-latency-ms 50
+
+    # Profile a slow run (writes .pstats, collapsed stacks and the slowest files)
+    python rename_photos_exif.py /path/to/photos --simulate --profile --profile-prefix /tmp/photos
 """
 
 import os
@@ -30,6 +39,9 @@ import re
 import logging
 from pathlib import Path
 
+from io_scheduler import DEFAULT_MAX_WORKERS, IOScheduler, add_io_arguments, scheduler_from_args
+from profiling import NO_TIMING, add_profile_arguments, profile_from_args
+
 try:
     from PIL import Image
     from PIL.ExifTags import TAGS
@@ -42,6 +54,8 @@ except ImportError:
 # Constants
 VERSION = "1.0.0"
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tiff', '.tif', '.heic', '.jfif', '.arw', '.nef', '.cr2', '.dng', '.raw'}
+# Approximate bytes Pillow reads to get at the EXIF block of an image
+EXIF_READ_BYTES = 64 * 1024
 
 # Set up logging
 logging.basicConfig(
@@ -67,17 +81,29 @@ def parse_arguments():
                         help='Process subdirectories')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='Verbose output')
+    parser.add_argument('--inventory', '-i',
+                        help='Inventory written by inventory.py to take the image files from')
+    parser.add_argument('--workers', '-w', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f'Maximum number of concurrent EXIF reads (default: {DEFAULT_MAX_WORKERS})')
+    add_io_arguments(parser)
+    add_profile_arguments(parser)
     parser.add_argument('--version', action='version', 
                         version=f'%(prog)s {VERSION}')
     
     return parser.parse_args()
 
-def find_image_files(source_dir, recursive=False):
+def find_image_files(source_dir, recursive=False, inventory_path=None):
     """Find all image files in the source directory"""
     source_dir = Path(source_dir)
     image_files = []
     
-    if recursive:
+    if inventory_path:
+        # Take the candidates from the inventory instead of walking the tree
+        from inventory import Inventory
+        inventory = Inventory.load(inventory_path)
+        extensions = [ext.lstrip('.') for ext in IMAGE_EXTENSIONS]
+        image_files = [Path(p) for p in inventory.paths(extensions, source_dir, recursive)]
+    elif recursive:
         # Recursive search
         for root, _, files in os.walk(source_dir):
             for file in files:
@@ -181,8 +207,23 @@ def generate_new_filename(file_path, exif_data):
             logger.error(f"Failed to generate fallback filename for {file_path}: {e}")
             return None
 
-def rename_photos(source_dir, simulate=False, recursive=False, verbose=False):
-    """Main function to rename photos"""
+def read_exif(file_path, timer=NO_TIMING):
+    """Read the EXIF data of one image; returns (exif_data, error)"""
+    try:
+        with timer.stage(file_path, 'open'):
+            img = Image.open(file_path)
+        with img, timer.stage(file_path, 'parse'):
+            return get_exif_data(img), None
+    except Exception as e:
+        return None, e
+
+def rename_photos(source_dir, simulate=False, recursive=False, verbose=False, inventory_path=None,
+                  scheduler=None, timer=NO_TIMING):
+    """
+    Main function to rename photos.
+    EXIF data is read ahead concurrently through the IOScheduler; the renames
+    themselves run in order so that name conflicts are resolved deterministically.
+    """
     # Set logging level based on verbose flag
     if verbose:
         logger.setLevel(logging.DEBUG)
@@ -193,7 +234,7 @@ def rename_photos(source_dir, simulate=False, recursive=False, verbose=False):
         logger.warning("Install with: pip install Pillow")
     
     # Find all image files
-    image_files = find_image_files(source_dir, recursive)
+    image_files = find_image_files(source_dir, recursive, inventory_path)
     
     if not image_files:
         logger.info("No image files found in the specified directory.")
@@ -211,31 +252,33 @@ def rename_photos(source_dir, simulate=False, recursive=False, verbose=False):
         'files_without_exif': 0
     }
     
+    scheduler = scheduler or IOScheduler()
+    if PILLOW_AVAILABLE:
+        exif_results = scheduler.map(lambda path: read_exif(path, timer), image_files,
+                                     nbytes=lambda path: EXIF_READ_BYTES)
+    else:
+        exif_results = ((None, None) for _ in image_files)
+    
     # Process each file
-    for file_path in image_files:
+    for file_path, (exif_data, exif_error) in zip(image_files, exif_results):
         try:
-            # Extract EXIF data if available
-            exif_data = None
-            if PILLOW_AVAILABLE:
-                try:
-                    with Image.open(file_path) as img:
-                        exif_data = get_exif_data(img)
-                        if exif_data:
-                            stats['files_with_exif'] += 1
-                            if verbose:
-                                logger.debug(f"EXIF data found for {file_path}")
-                        else:
-                            stats['files_without_exif'] += 1
-                            if verbose:
-                                logger.debug(f"No EXIF data found for {file_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to extract EXIF data from {file_path}: {e}")
-                    stats['files_without_exif'] += 1
+            # Count the EXIF data read ahead
+            if exif_error is not None:
+                logger.warning(f"Failed to extract EXIF data from {file_path}: {exif_error}")
+                exif_data = None
+                stats['files_without_exif'] += 1
+            elif exif_data:
+                stats['files_with_exif'] += 1
+                if verbose:
+                    logger.debug(f"EXIF data found for {file_path}")
             else:
                 stats['files_without_exif'] += 1
+                if verbose and PILLOW_AVAILABLE:
+                    logger.debug(f"No EXIF data found for {file_path}")
             
             # Generate new filename
-            new_filename = generate_new_filename(file_path, exif_data)
+            with timer.stage(file_path, 'stat'):
+                new_filename = generate_new_filename(file_path, exif_data)
             if not new_filename:
                 logger.warning(f"Could not generate new filename for {file_path}")
                 stats['skipped_files'] += 1
@@ -253,17 +296,19 @@ def rename_photos(source_dir, simulate=False, recursive=False, verbose=False):
             # Handle filename conflicts
             counter = 1
             original_new_path = new_path
-            while new_path.exists():
-                stem = original_new_path.stem
-                suffix = original_new_path.suffix
-                new_filename = f"{stem}_{counter}{suffix}"
-                new_path = file_path.parent / new_filename
-                counter += 1
+            with timer.stage(file_path, 'stat'):
+                while new_path.exists():
+                    stem = original_new_path.stem
+                    suffix = original_new_path.suffix
+                    new_filename = f"{stem}_{counter}{suffix}"
+                    new_path = file_path.parent / new_filename
+                    counter += 1
             
             # Rename the file
             if not simulate:
                 try:
-                    file_path.rename(new_path)
+                    with timer.stage(file_path, 'rename'):
+                        scheduler.call(file_path.rename, new_path)
                     logger.info(f"Renamed: {file_path.name} → {new_filename}")
                     stats['renamed_files'] += 1
                 except Exception as e:
@@ -285,6 +330,7 @@ def rename_photos(source_dir, simulate=False, recursive=False, verbose=False):
     logger.info(f"  Files renamed: {stats['renamed_files']}")
     logger.info(f"  Files skipped: {stats['skipped_files']}")
     logger.info(f"  Errors: {stats['error_files']}")
+    logger.info(f"  I/O: {scheduler.summary()}")
     
     if simulate:
         logger.info("\nThis was a simulation. No files were actually renamed.")
@@ -304,12 +350,16 @@ def main():
         logger.info(f"Mode: {'Simulation' if args.simulate else 'Actual'}")
         logger.info(f"Recursive: {'Yes' if args.recursive else 'No'}")
         
-        rename_photos(
-            source_dir=source_dir,
-            simulate=args.simulate,
-            recursive=args.recursive,
-            verbose=args.verbose
-        )
+        with profile_from_args(args, __file__) as timer:
+            rename_photos(
+                source_dir=source_dir,
+                simulate=args.simulate,
+                recursive=args.recursive,
+                verbose=args.verbose,
+                inventory_path=args.inventory,
+                scheduler=scheduler_from_args(args, max_workers=args.workers),
+                timer=timer
+            )
         
         return 0
     except Exception as e:
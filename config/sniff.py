@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+sniff.py - Classify files by their leading magic bytes
+
+The "Handle Files With No Extension" and "Handle Unusual File Extensions" rules
+send everything they match to Organized/Other/ without looking at the content,
+although plenty of those files are JPEGs, PDFs, ZIPs or SQLite databases. This
+module reads at most the first 512 bytes of each file (a single read, no
+`file`/libmagic process) and matches them against a built-in signature table.
+Many files are sniffed concurrently, so a pass over a large number of files
+costs about one small read per file.
+
+organize_plan.py uses it to route those files to the rule that handles the
+detected extension when a plan is recorded.
+
+Usage:
+    # Show the detected type of every file without an extension
+    python sniff.py /path/to/files
+
+    # Include subdirectories and files with any extension
+    python sniff.py /path/to/files --recursive --all
+
+    # Take the candidate files from an inventory instead of walking the tree
+    python sniff.py /path/to/files --recursive --inventory files.inventory
+"""
+
+import os
+import sys
+import argparse
+from collections import Counter
+
+from io_scheduler import IOScheduler, add_io_arguments, scheduler_from_args
+
+# Constants
+SNIFF_BYTES = 512
+DEFAULT_WORKERS = 16
+# Rules whose matches are re-routed by content when a plan is recorded. Can be
+# overridden with a top-level `sniff: {rules: [...]}` section in organize.yaml.
+DEFAULT_SNIFF_RULES = ('Handle Files With No Extension', 'Handle Unusual File Extensions')
+
+# (offset, magic bytes, extension). The first match wins, so more specific
+# signatures come before the generic ones they overlap with.
+SIGNATURES = [
+    (0, b'\xff\xd8\xff', 'jpg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'png'),
+    (0, b'GIF87a', 'gif'),
+    (0, b'GIF89a', 'gif'),
+    (0, b'II*\x00', 'tif'),
+    (0, b'MM\x00*', 'tif'),
+    (0, b'8BPS', 'psd'),
+    (0, b'%PDF-', 'pdf'),
+    (0, b'%!PS', 'eps'),
+    (0, b'{\\rtf', 'rtf'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'doc'),
+    (0, b'SQLite format 3\x00', 'sqlite3'),
+    (0, b'Rar!\x1a\x07', 'rar'),
+    (0, b'7z\xbc\xaf\x27\x1c', '7z'),
+    (0, b'\x1f\x8b', 'gz'),
+    (0, b'BZh', 'bz2'),
+    (0, b'\xfd7zXZ\x00', 'xz'),
+    (0, b'\x28\xb5\x2f\xfd', 'zst'),
+    (257, b'ustar', 'tar'),
+    (0, b'ID3', 'mp3'),
+    (0, b'fLaC', 'flac'),
+    (0, b'OggS', 'ogg'),
+    (0, b'\x1aE\xdf\xa3', 'mkv'),
+    (0, b'OTTO', 'otf'),
+    (0, b'wOFF', 'woff'),
+    (0, b'wOF2', 'woff2'),
+    (0, b'\x7fELF', 'bin'),
+    (0, b'\xcf\xfa\xed\xfe', 'bin'),
+    (0, b'\xce\xfa\xed\xfe', 'bin'),
+    (0, b'MZ', 'exe'),
+    (0, b'<?xml', 'xml'),
+]
+
+# Brands in the ISO base media `ftyp` box
+FTYP_BRANDS = {
+    b'qt  ': 'mov',
+    b'M4A ': 'm4a',
+    b'M4V ': 'm4v',
+    b'heic': 'heic',
+    b'heix': 'heic',
+    b'mif1': 'heic',
+    b'3gp4': '3gp',
+    b'3gp5': '3gp',
+}
+# RIFF containers, identified by the form type at offset 8
+RIFF_TYPES = {
+    b'WEBP': 'webp',
+    b'WAVE': 'wav',
+    b'AVI ': 'avi',
+}
+# ZIP based formats, identified by member names near the start of the archive
+ZIP_MEMBERS = [
+    (b'word/', 'docx'),
+    (b'xl/', 'xlsx'),
+    (b'ppt/', 'pptx'),
+    (b'mimetypeapplication/vnd.oasis.opendocument.text', 'odt'),
+    (b'mimetypeapplication/vnd.oasis.opendocument.spreadsheet', 'ods'),
+    (b'AndroidManifest.xml', 'apk'),
+    (b'META-INF/', 'jar'),
+]
+
+
+def read_head(file_path, size=SNIFF_BYTES):
+    """Read at most `size` bytes from the start of a file with a single read"""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+def identify(head):
+    """Return the extension matching the given leading bytes, or None"""
+    if len(head) >= 12 and head[4:8] == b'ftyp':
+        return FTYP_BRANDS.get(head[8:12], 'mp4')
+    if len(head) >= 12 and head[:4] == b'RIFF':
+        return RIFF_TYPES.get(head[8:12])
+    if head[:4] in (b'PK\x03\x04', b'PK\x05\x06'):
+        for member, extension in ZIP_MEMBERS:
+            if member in head:
+                return extension
+        return 'zip'
+
+    for offset, magic, extension in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return extension
+    return None
+
+
+def sniff_file(file_path):
+    """Return the extension detected from a file's content, or None"""
+    try:
+        return identify(read_head(file_path))
+    except OSError:
+        return None
+
+
+def sniff_files(paths, workers=DEFAULT_WORKERS, scheduler=None):
+    """
+    Sniff many files concurrently, one IOScheduler operation per file.
+    Returns a dict mapping each path to its detected extension (or None).
+    """
+    paths = list(paths)
+    if not paths:
+        return {}
+    scheduler = scheduler or IOScheduler(max_workers=workers)
+    return dict(zip(paths, scheduler.map(sniff_file, paths, nbytes=lambda path: SNIFF_BYTES)))
+
+
+def extension_destinations(config, skip_rules=()):
+    """
+    Map each extension to the destination directory of the first rule that
+    organizes it by extension with a move action.
+    """
+    destinations = {}
+    for rule in config.get('rules', []):
+        if not rule.get('enabled', True) or rule.get('name') in skip_rules:
+            continue
+
+        filters = rule.get('filters') or []
+        # Duplicate rules need more than the extension to match
+        if any(isinstance(f, dict) and 'duplicate' in f for f in filters):
+            continue
+        extensions = []
+        for f in filters:
+            if isinstance(f, dict) and isinstance(f.get('extension'), list):
+                extensions.extend(str(e).lower() for e in f['extension'])
+
+        dest = None
+        for action in rule.get('actions') or []:
+            if isinstance(action, dict) and 'move' in action:
+                dest = action['move'].get('dest') if isinstance(action['move'], dict) else action['move']
+        if not dest or not dest.endswith('/'):
+            continue
+
+        for extension in extensions:
+            destinations.setdefault(extension, dest)
+    return destinations
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Detect file types from their leading magic bytes',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('source_dir', help='Directory containing the files to sniff')
+    parser.add_argument('--recursive', '-r', action='store_true',
+                        help='Process subdirectories')
+    parser.add_argument('--all', '-a', action='store_true',
+                        help='Sniff all files, not only those without an extension')
+    parser.add_argument('--workers', '-w', type=int, default=DEFAULT_WORKERS,
+                        help=f'Maximum number of concurrent reads (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--inventory', '-i',
+                        help='Inventory written by inventory.py to take the files from')
+    add_io_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point"""
+    args = parse_arguments()
+
+    if not os.path.isdir(args.source_dir):
+        print(f"Error: Source directory does not exist: {args.source_dir}")
+        return 1
+
+    paths = []
+    if args.inventory:
+        from inventory import Inventory
+        inventory = Inventory.load(args.inventory)
+        paths = inventory.paths(None if args.all else [''], args.source_dir, args.recursive)
+    else:
+        for root, dirs, files in os.walk(args.source_dir):
+            for name in files:
+                if args.all or not os.path.splitext(name)[1]:
+                    paths.append(os.path.join(root, name))
+            if not args.recursive:
+                break
+
+    scheduler = scheduler_from_args(args, max_workers=args.workers)
+    results = sniff_files(paths, scheduler=scheduler)
+    for path, extension in sorted(results.items()):
+        print(f"{extension or '-':8} {path}")
+
+    counts = Counter(extension or 'unknown' for extension in results.values())
+    print(f"\nSniffed {len(results)} files:")
+    for extension, count in counts.most_common():
+        print(f"  {extension}: {count}")
+    print(scheduler.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,32 +5,72 @@ test_music_metadata.py - Script to test the metadata evaluation for music files
 This script demonstrates how the metadata evaluation works for music files in the
 organize-tool configuration. It takes two music files as input and compares their
 metadata completeness using the same logic as in the configuration.
+
+With --library it scores a whole music tree instead, using a pool of worker
+processes, and writes one row per file (path, format, tags present, score) to a
+CSV or JSONL file. Rows of files whose size and modification time did not
+change since the previous run are reused from the existing output file.
+
+Use --profile to write a cProfile .pstats file, collapsed stacks for a flame
+graph and the per-stage timings (open, parse, stat) of the files;
+--profile-prefix PREFIX names the files.
+
+Usage:
+    # Compare two files
+    python test_music_metadata.py song1.mp3 song2.mp3
+
+    # Score a whole library (re-runs only score new or changed files)
+    python test_music_metadata.py --library /path/to/music --output scores.csv
 """
 
 import os
 import sys
+import csv
+import json
+import time
 import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
 import mutagen
 
-def score_metadata(file_path):
+from profiling import NO_TIMING, add_profile_arguments, profile_from_args
+
+# Constants
+# Extensions of the "Handle Music File Duplicates" rule in organize.yaml
+AUDIO_EXTENSIONS = {'mp3', 'wav', 'aac', 'flac', 'm4a', 'wma', 'opus', 'm4r', 'ogg', 'aiff', 'aif', 'aifc'}
+ROW_FIELDS = ['path', 'format', 'tags', 'score', 'size', 'mtime_ns', 'error']
+UNREADABLE = "Could not read metadata"
+DEFAULT_OUTPUT = 'music_scores.jsonl'
+# Seconds between writes of the rows scored so far, so an interrupted run can resume
+CHECKPOINT_SECONDS = 60
+
+def evaluate_metadata(file_path, timer=NO_TIMING, file_size=None):
     """
-    Score the metadata completeness of a music file.
-    Higher score means more complete metadata.
+    Evaluate the metadata of a music file without printing anything.
+    Returns a dict with the format, tag type, tags found, size, size score,
+    score and error (None if the file could be read).
     """
+    result = {'format': None, 'tag_type': None, 'tags': [], 'size': file_size,
+              'size_score': 0, 'score': 0, 'error': None}
     try:
-        audio = mutagen.File(file_path)
+        with timer.stage(file_path, 'open'):
+            fileobj = open(file_path, 'rb')
+        with fileobj, timer.stage(file_path, 'parse'):
+            audio = mutagen.File(fileobj)
         if audio is None:
-            print(f"Could not read metadata from {file_path}")
-            return 0
+            result['error'] = UNREADABLE
+            return result
+        result['format'] = type(audio).__name__
         
         score = 0
-        tags_found = []
+        tags_found = result['tags']
         
         # Check for common tag fields
         # Different audio formats use different tag structures
         # ID3 (MP3)
         if hasattr(audio, 'tags') and audio.tags:
-            print(f"File has ID3 tags: {file_path}")
+            result['tag_type'] = "ID3 tags"
             # ID3 tags
             if 'TPE1' in audio:  # Artist
                 score += 1
@@ -52,7 +92,7 @@ def score_metadata(file_path):
                 tags_found.append("Cover Art (APIC)")
         # FLAC/Vorbis comments
         elif hasattr(audio, 'get'):
-            print(f"File has Vorbis comments: {file_path}")
+            result['tag_type'] = "Vorbis comments"
             if audio.get('artist'):
                 score += 1
                 tags_found.append("Artist")
@@ -73,7 +113,7 @@ def score_metadata(file_path):
                 tags_found.append("Cover Art")
         # MP4/AAC
         elif hasattr(audio, 'keys'):
-            print(f"File has MP4/AAC tags: {file_path}")
+            result['tag_type'] = "MP4/AAC tags"
             if '\xa9ART' in audio:  # Artist
                 score += 1
                 tags_found.append("Artist")
@@ -94,29 +134,194 @@ def score_metadata(file_path):
                 tags_found.append("Cover Art")
         
         # Add a small bonus for higher quality files (using file size as a proxy)
-        file_size = os.path.getsize(file_path)
+        if file_size is None:
+            with timer.stage(file_path, 'stat'):
+                file_size = os.path.getsize(file_path)
         size_score = min(file_size / 10000000, 0.5)  # Max 0.5 points for size
         score += size_score
         
-        print(f"File size: {file_size} bytes, Size score: {size_score:.2f}")
-        print(f"Tags found: {', '.join(tags_found)}")
-        
-        return score
+        result.update(size=file_size, size_score=size_score, score=score)
+        return result
     except Exception as e:
-        print(f"Error processing {file_path}: {e}")
+        result['error'] = str(e)
+        return result
+
+def score_metadata(file_path, timer=NO_TIMING):
+    """
+    Score the metadata completeness of a music file.
+    Higher score means more complete metadata.
+    """
+    result = evaluate_metadata(file_path, timer)
+    if result['error'] == UNREADABLE:
+        print(f"Could not read metadata from {file_path}")
         return 0
+    if result['error']:
+        print(f"Error processing {file_path}: {result['error']}")
+        return 0
+    
+    if result['tag_type']:
+        print(f"File has {result['tag_type']}: {file_path}")
+    print(f"File size: {result['size']} bytes, Size score: {result['size_score']:.2f}")
+    print(f"Tags found: {', '.join(result['tags'])}")
+    
+    return result['score']
+
+def find_music_files(library, inventory_path=None):
+    """Return [(path, size, mtime_ns)] of the music files below a directory"""
+    if inventory_path:
+        from inventory import Inventory
+        inventory = Inventory.load(inventory_path)
+        return [(path, size, mtime_ns) for path, size, mtime_ns, _, _ in inventory.rows(AUDIO_EXTENSIONS, library)]
+    
+    files = []
+    pending = [library]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif os.path.splitext(entry.name)[1][1:].lower() in AUDIO_EXTENSIONS:
+                            st = entry.stat(follow_symlinks=False)
+                            files.append((entry.path, st.st_size, st.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return files
+
+def score_row(item, timer=NO_TIMING):
+    """Score one (path, size, mtime_ns) tuple and return its output row"""
+    path, size, mtime_ns = item
+    result = evaluate_metadata(path, timer, file_size=size)
+    return {
+        'path': path,
+        'format': result['format'] or '',
+        'tags': result['tags'],
+        'score': round(result['score'], 4),
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'error': result['error'] or '',
+    }
+
+def read_rows(output_path):
+    """Read the rows of a previous run, keyed by path (empty if there is none)"""
+    rows = {}
+    try:
+        with open(output_path, 'r', newline='', encoding='utf-8') as file:
+            if output_path.endswith('.csv'):
+                for row in csv.DictReader(file):
+                    row['tags'] = row['tags'].split(';') if row['tags'] else []
+                    row['score'] = float(row['score'])
+                    row['size'] = int(row['size'])
+                    row['mtime_ns'] = int(row['mtime_ns'])
+                    rows[row['path']] = row
+            else:
+                for line in file:
+                    if line.strip():
+                        row = json.loads(line)
+                        rows[row['path']] = row
+    except (OSError, ValueError, KeyError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Warning: Ignoring previous results in {output_path}: {e}")
+        return {}
+    return rows
+
+def write_rows(output_path, rows):
+    """Write the rows as CSV or JSON lines (by extension), replacing the file atomically"""
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as file:
+        if output_path.endswith('.csv'):
+            writer = csv.DictWriter(file, fieldnames=ROW_FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(dict(row, tags=';'.join(row['tags'])))
+        else:
+            for row in rows:
+                file.write(json.dumps(row) + '\n')
+    os.replace(tmp_path, output_path)
+
+def score_library(library, output_path, workers=None, inventory_path=None, timer=NO_TIMING):
+    """
+    Score every music file below a library directory and write the rows.
+    Files whose size and mtime match the previous output are not read again,
+    and the rows are written every CHECKPOINT_SECONDS, so a run that is
+    interrupted continues where it stopped. With a stage timer (--profile) the files are scored in this process so
+    that the profile sees the work.
+    """
+    start = time.perf_counter()
+    files = find_music_files(library, inventory_path)
+    previous = read_rows(output_path)
+    
+    rows = {}
+    todo = []
+    for item in files:
+        row = previous.get(item[0])
+        if row is not None and (row['size'], row['mtime_ns']) == item[1:]:
+            rows[item[0]] = row
+        else:
+            todo.append(item)
+    
+    print(f"Found {len(files)} music files, {len(rows)} unchanged since the last run, scoring {len(todo)}")
+    scored = []
+    checkpoint = time.monotonic()
+    with contextlib.ExitStack() as stack:
+        if timer.enabled:
+            results = (score_row(item, timer) for item in todo)
+        elif todo:
+            workers = workers or os.cpu_count() or 1
+            chunksize = max(1, min(256, len(todo) // (workers * 8)))
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            results = executor.map(score_row, todo, chunksize=chunksize)
+        else:
+            results = []
+        for row in results:
+            rows[row['path']] = row
+            scored.append(row)
+            if time.monotonic() - checkpoint >= CHECKPOINT_SECONDS:
+                write_rows(output_path, sorted(rows.values(), key=lambda row: row['path']))
+                checkpoint = time.monotonic()
+    
+    ordered = sorted(rows.values(), key=lambda row: row['path'])
+    write_rows(output_path, ordered)
+    
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for row in scored if row['error'])
+    rate = len(todo) / elapsed * 60 if elapsed > 0 else 0
+    print(f"Scored {len(todo)} files in {elapsed:.1f} s ({rate:,.0f} files/min), {errors} unreadable")
+    print(f"Wrote {len(ordered)} rows to {output_path}")
+    return ordered
 
 def main():
     parser = argparse.ArgumentParser(description='Compare metadata completeness of music files')
-    parser.add_argument('file1', help='First music file')
-    parser.add_argument('file2', help='Second music file')
+    parser.add_argument('file1', nargs='?', help='First music file')
+    parser.add_argument('file2', nargs='?', help='Second music file')
+    parser.add_argument('--library', '-l', metavar='DIR',
+                        help='Score every music file below DIR instead of comparing two files')
+    parser.add_argument('--output', '-o', default=DEFAULT_OUTPUT,
+                        help=f'Output file for --library, .csv or .jsonl (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--workers', '-w', type=int,
+                        help='Number of worker processes for --library (default: number of CPUs)')
+    parser.add_argument('--inventory', '-i',
+                        help='Inventory written by inventory.py to take the --library files from')
+    add_profile_arguments(parser)
+    
+    args = parser.parse_args()
+    
+    if args.library:
+        if not os.path.isdir(args.library):
+            print(f"Error: Library directory not found: {args.library}")
+            sys.exit(1)
+        with profile_from_args(args, __file__) as timer:
+            score_library(os.path.abspath(args.library), args.output, args.workers, args.inventory, timer)
+        return
     
-    if len(sys.argv) < 3:
+    if not args.file1 or not args.file2:
         print("Usage: python test_music_metadata.py file1.mp3 file2.mp3")
+        print("       python test_music_metadata.py --library DIR [--output scores.csv]")
         sys.exit(1)
     
-    args = parser.parse_args()
-    
     file1 = args.file1
     file2 = args.file2
     
@@ -128,13 +333,14 @@ def main():
         print(f"Error: File not found: {file2}")
         sys.exit(1)
     
-    print(f"Evaluating metadata for: {file1}")
-    score1 = score_metadata(file1)
-    print(f"Metadata score: {score1:.2f}\n")
-    
-    print(f"Evaluating metadata for: {file2}")
-    score2 = score_metadata(file2)
-    print(f"Metadata score: {score2:.2f}\n")
+    with profile_from_args(args, __file__) as timer:
+        print(f"Evaluating metadata for: {file1}")
+        score1 = score_metadata(file1, timer)
+        print(f"Metadata score: {score1:.2f}\n")
+        
+        print(f"Evaluating metadata for: {file2}")
+        score2 = score_metadata(file2, timer)
+        print(f"Metadata score: {score2:.2f}\n")
     
     print("=== Results ===")
     if score1 > score2:
@@ -0,0 +1,12 @@
+import pytest
+
+import config_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory, monkeypatch):
+    """Keep the configuration cache out of the user's home directory"""
+    path = tmp_path_factory.mktemp('cache')
+    monkeypatch.setenv('ORGANIZE_FILES_CACHE', str(path))
+    monkeypatch.setattr(config_cache, 'CACHE_DIR', path)
+    return path
@@ -0,0 +1,164 @@
+import json
+import os
+import tarfile
+
+import pytest
+
+import compact
+
+
+def make_files(directory, names):
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name in names:
+        (directory / name).write_text(f"data {name}")
+        paths.append(str(directory / name))
+    return paths
+
+
+def archive_members(directory):
+    archives = sorted(directory.glob('*.tar.gz'))
+    members = []
+    for archive in archives:
+        with tarfile.open(archive) as tar:
+            members.extend(tar.getnames())
+    return archives, sorted(members)
+
+
+def test_missing_source_keeps_the_archive(tmp_path):
+    a, b, c = make_files(tmp_path / 'src', ['a.log', 'b.log', 'c.log'])
+    writer = compact.ArchiveWriter(tmp_path / 'out')
+    writer.add(a, basedir=tmp_path / 'src')
+    writer.add(b, basedir=tmp_path / 'src')
+    fp = compact.fingerprint(c)
+    os.remove(c)
+    with pytest.raises(OSError):
+        writer.add(c, basedir=tmp_path / 'src', fp=fp)
+    writer.finalize()
+
+    archives, members = archive_members(tmp_path / 'out')
+    assert len(archives) == 1 and members == ['a.log', 'b.log']
+    assert not os.listdir(tmp_path / 'src')
+    assert writer.stats['dropped'] == 0
+    with open(str(archives[0]) + compact.INDEX_SUFFIX) as file:
+        assert [json.loads(line)['source'] for line in file] == [a, b]
+
+
+def test_unreadable_source_keeps_the_archive(tmp_path, monkeypatch):
+    a, b = make_files(tmp_path / 'src', ['a.log', 'b.log'])
+    writer = compact.ArchiveWriter(tmp_path / 'out')
+    writer.add(a)
+
+    def unreadable(path, *args, **kwargs):
+        if str(path) == b:
+            raise PermissionError(13, 'Permission denied', b)
+        return open(path, *args, **kwargs)
+
+    monkeypatch.setattr(compact, 'open', unreadable, raising=False)
+    with pytest.raises(PermissionError):
+        writer.add(b)
+    writer.finalize()
+    assert archive_members(tmp_path / 'out')[1] == [a.lstrip('/')]
+    assert os.listdir(tmp_path / 'src') == ['b.log']
+
+
+def test_changed_source_is_not_archived(tmp_path):
+    a, b = make_files(tmp_path / 'src', ['a.log', 'b.log'])
+    fp = compact.fingerprint(b)
+    with open(b, 'a') as file:
+        file.write('more')
+    writer = compact.ArchiveWriter(tmp_path / 'out')
+    writer.add(a, basedir=tmp_path / 'src')
+    with pytest.raises(OSError):
+        writer.add(b, basedir=tmp_path / 'src', fp=fp)
+    writer.finalize()
+    assert archive_members(tmp_path / 'out')[1] == ['a.log']
+    assert os.listdir(tmp_path / 'src') == ['b.log']
+
+
+def test_write_error_drops_the_archive(tmp_path, monkeypatch):
+    a, b = make_files(tmp_path / 'src', ['a.log', 'b.log'])
+    writer = compact.ArchiveWriter(tmp_path / 'out')
+    writer.add(a)
+
+    def broken_addfile(*args, **kwargs):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(writer.tar, 'addfile', broken_addfile)
+    with pytest.raises(OSError):
+        writer.add(b)
+    writer.finalize()
+    assert writer.stats['dropped'] == 1
+    assert not os.listdir(tmp_path / 'out')
+    assert sorted(os.listdir(tmp_path / 'src')) == ['a.log', 'b.log']
+
+
+def test_close_finalizes_the_other_writers_after_a_failure(tmp_path, monkeypatch):
+    logs = make_files(tmp_path / 'logs', ['a.log', 'b.log'])
+    temps = make_files(tmp_path / 'tmp', ['a.tmp'])
+    compactor = compact.Compactor([{'rule': 'Logs'}, {'rule': 'Temp'}])
+    for path in logs:
+        compactor.add('Logs', path, tmp_path / 'out' / 'Logs')
+    compactor.add('Temp', temps[0], tmp_path / 'out' / 'Temp')
+
+    def broken_finalize():
+        raise OSError('Input/output error')
+
+    monkeypatch.setattr(compactor.writers[('Logs', str(tmp_path / 'out' / 'Logs'))], 'finalize', broken_finalize)
+    stats = compactor.close()
+
+    assert stats['archives'] == 1 and stats['files'] == 1 and stats['dropped'] == 2
+    assert not os.listdir(tmp_path / 'out' / 'Logs')
+    assert sorted(os.listdir(tmp_path / 'logs')) == ['a.log', 'b.log']
+    assert not os.listdir(tmp_path / 'tmp')
+
+
+def test_rules_sharing_a_destination_write_separate_archives(tmp_path):
+    logs = make_files(tmp_path / 'src', [f'{n}.log' for n in range(20)])
+    temps = make_files(tmp_path / 'src', [f'{n}.tmp' for n in range(20)])
+    dest = tmp_path / 'Organized' / 'Other'
+    compactor = compact.Compactor([{'rule': 'Identify Log Files'}, {'rule': 'Identify Temporary Files'}])
+    for log, temp in zip(logs, temps):
+        compactor.add('Identify Log Files', log, dest, tmp_path / 'src')
+        compactor.add('Identify Temporary Files', temp, dest, tmp_path / 'src')
+    stats = compactor.close()
+
+    assert stats == {'archives': 2, 'files': 40, 'bytes': stats['bytes'], 'kept': 0, 'dropped': 0}
+    archives, members = archive_members(dest)
+    assert len(archives) == 2
+    assert members == sorted(os.path.basename(path) for path in logs + temps)
+    assert all(os.path.exists(str(archive) + compact.INDEX_SUFFIX) for archive in archives)
+    assert not os.listdir(tmp_path / 'src')
+
+
+def test_abort_leaves_other_writers_files_alone(tmp_path, monkeypatch):
+    a, b = make_files(tmp_path / 'src', ['a.log', 'b.tmp'])
+    first = compact.ArchiveWriter(tmp_path / 'out', prefix='Other')
+    second = compact.ArchiveWriter(tmp_path / 'out', prefix='Other')
+    first.add(a)
+    second.add(b)
+    assert first.tmp_path != second.tmp_path
+    first.finalize()
+
+    second.abort()
+    archives, members = archive_members(tmp_path / 'out')
+    assert members == [a.lstrip('/')]
+    assert os.path.exists(str(archives[0]) + compact.INDEX_SUFFIX)
+
+
+def test_same_name_from_two_locations_stays_apart(tmp_path):
+    nas = make_files(tmp_path / 'nas', ['app.log'])[0]
+    usb = make_files(tmp_path / 'usb', ['app.log'])[0]
+    writer = compact.ArchiveWriter(tmp_path / 'out')
+    writer.add(nas, basedir=tmp_path / 'nas')
+    writer.add(usb, basedir=tmp_path / 'usb')
+    writer.finalize()
+
+    archives, members = archive_members(tmp_path / 'out')
+    assert members == sorted(['app.log', usb.lstrip('/')])
+    with tarfile.open(archives[0]) as tar:
+        contents = {name: tar.extractfile(name).read() for name in tar.getnames()}
+    assert sorted(contents.values()) == [b'data app.log', b'data app.log']
+    with open(str(archives[0]) + compact.INDEX_SUFFIX) as file:
+        index = {json.loads(line)['member']: json.loads(line)['source'] for line in file}
+    assert index == {'app.log': nas, usb.lstrip('/'): usb}
@@ -0,0 +1,14 @@
+import importlib.metadata
+
+import config_cache
+
+
+def test_cache_key_changes_with_the_organize_tool_version(monkeypatch):
+    key = config_cache.cache_key('rules: []\n')
+    version = importlib.metadata.version
+
+    def upgraded(name):
+        return '99.0' if name == 'organize-tool' else version(name)
+
+    monkeypatch.setattr(importlib.metadata, 'version', upgraded)
+    assert config_cache.cache_key('rules: []\n') != key
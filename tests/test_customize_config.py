@@ -0,0 +1,225 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import customize_config
+from config_cache import load_yaml
+
+SHIPPED_CONFIG = Path(__file__).resolve().parents[1] / 'config' / 'organize.yaml'
+
+
+# update_path and its folder table as they were before DestinationIndex, kept
+# verbatim as the reference the trie has to reproduce
+
+
+def legacy_organized_paths(dest_base):
+    # Define the standard folder structure based on the user's specification
+    organized_paths = {
+        'Documents/Text/': f"{dest_base}/Organized/Documents/Text/",
+        'Documents/Office/': f"{dest_base}/Organized/Documents/Office/",
+        'Documents/PDF/': f"{dest_base}/Organized/Documents/PDF/",
+        'Documents/Other/': f"{dest_base}/Organized/Documents/Other/",
+        'Media/Images/Photos/': f"{dest_base}/Organized/Media/Images/Photos/",
+        'Media/Images/Raw/': f"{dest_base}/Organized/Media/Images/Raw/",
+        'Media/Images/Vector/': f"{dest_base}/Organized/Media/Images/Vector/",
+        'Media/Images/Adobe/': f"{dest_base}/Organized/Media/Images/Adobe/",
+        'Media/Audio/': f"{dest_base}/Organized/Media/Audio/",
+        'Media/Audio/Playlists/': f"{dest_base}/Organized/Media/Audio/Playlists/",
+        'Media/Video/': f"{dest_base}/Organized/Media/Video/",
+        'Development/Code/': f"{dest_base}/Organized/Development/Code/",
+        'Development/Web/': f"{dest_base}/Organized/Development/Web/",
+        'Development/Data/': f"{dest_base}/Organized/Development/Data/",
+        'Development/Data/Database/': f"{dest_base}/Organized/Development/Data/Database/",
+        'Archives/': f"{dest_base}/Organized/Archives/",
+        'Archives/Split/': f"{dest_base}/Organized/Archives/Split/",
+        'Applications/': f"{dest_base}/Organized/Applications/",
+        'Fonts/': f"{dest_base}/Organized/Fonts/",
+        'System/Config/': f"{dest_base}/Organized/System/Config/",
+        'Other/': f"{dest_base}/Organized/Other/",
+        'Other/NoExtension/': f"{dest_base}/Organized/Other/NoExtension/",
+        'Cleanup/Temporary/': f"{dest_base}/Cleanup/Temporary/",
+        'Cleanup/Logs/': f"{dest_base}/Cleanup/Logs/",
+        'Cleanup/System/': f"{dest_base}/Cleanup/System/",
+        'Cleanup/ErrorReports/': f"{dest_base}/Cleanup/ErrorReports/",
+        'Cleanup/Duplicates/': f"{dest_base}/Cleanup/Duplicates/",
+        'Cleanup/Duplicates/Music/': f"{dest_base}/Cleanup/Duplicates/Music/",
+        'Cleanup/Duplicates/Images/': f"{dest_base}/Cleanup/Duplicates/Images/",
+        'Cleanup/Duplicates/Videos/': f"{dest_base}/Cleanup/Duplicates/Videos/",
+        'Cleanup/Duplicates/Other/': f"{dest_base}/Cleanup/Duplicates/Other/",
+        'Cleanup/URLFragments/': f"{dest_base}/Cleanup/URLFragments/",
+        'Cleanup/Unknown/': f"{dest_base}/Cleanup/Unknown/",
+    }
+
+    # Add additional mappings for common path patterns
+    additional_mappings = {
+        # Add mappings for paths with just the category name
+        'Organized': f"{dest_base}/Organized",
+        'Cleanup': f"{dest_base}/Cleanup",
+        # Add mappings for paths with /Organized/ or /Cleanup/
+        '/Organized/': f"{dest_base}/Organized/",
+        '/Cleanup/': f"{dest_base}/Cleanup/",
+    }
+    organized_paths.update(additional_mappings)
+    return organized_paths
+
+
+def legacy_update_path(old_path, dest_base, organized_paths):
+    """Update a path to use the new destination base while preserving folder structure."""
+    # Handle paths with placeholders like {extension}
+    if '{' in old_path and '}' in old_path:
+        # Find the most appropriate match in organized_paths
+        best_match = None
+        best_match_len = 0
+
+        for pattern_key, full_path in organized_paths.items():
+            # Check if this pattern is a good match for our path
+            # We look for the pattern without placeholders
+            pattern_parts = pattern_key.split('{')[0].strip('/')
+            if pattern_parts and pattern_parts in old_path.split('{')[0]:
+                if len(pattern_parts) > best_match_len:
+                    best_match = pattern_key
+                    best_match_len = len(pattern_parts)
+
+        if best_match:
+            # Extract the placeholder part
+            placeholder_part = old_path.split('/')[-1] if '/' in old_path else old_path
+            if not '{' in placeholder_part:  # No placeholder in the last part
+                base_path = organized_paths[best_match]
+                return base_path
+            else:
+                # Get the base path without the file part
+                base_path = '/'.join(organized_paths[best_match].split('/')[:-1])
+                return f"{base_path}/{placeholder_part}"
+
+        # If no good match, just replace the base
+        path_parts = old_path.split('/')
+        rel_path_start = 0
+
+        # Find where the actual relative path starts
+        for i, part in enumerate(path_parts):
+            if part.startswith('{') or 'Organized' in part or 'Cleanup' in part:
+                rel_path_start = i
+                break
+
+        rel_path = '/'.join(path_parts[rel_path_start:])
+        return f"{dest_base}/{rel_path}"
+    else:
+        # Handle direct paths without placeholders
+        # First try exact matches
+        for pattern_key, full_path in organized_paths.items():
+            if pattern_key.strip('/') in old_path:
+                # Match found, replace with the new full path
+                return full_path
+
+        # If no exact match, try to match based on path components
+        old_path_lower = old_path.lower()
+        for pattern_key, full_path in organized_paths.items():
+            pattern_parts = pattern_key.lower().split('/')
+            for part in pattern_parts:
+                if part and part in old_path_lower:
+                    # Found a matching component, extract the relative path
+                    path_parts = old_path.split('/')
+
+                    # Find the index of the matching part
+                    match_idx = -1
+                    for i, p in enumerate(path_parts):
+                        if part.lower() in p.lower():
+                            match_idx = i
+                            break
+
+                    if match_idx >= 0:
+                        # Extract the relative path from the matching part onwards
+                        rel_path = '/'.join(path_parts[match_idx:])
+                        # Replace the pattern key part with the full path
+                        return full_path
+
+        # If still no match, handle as general case
+        path_parts = old_path.split('/')
+
+        # Find where the actual relative path starts after home or base dir
+        rel_path_start = 0
+        for i, part in enumerate(path_parts):
+            if part.lower() in ('organized', 'cleanup', 'documents', 'media', 'development',
+                               'archives', 'applications', 'fonts', 'system', 'other'):
+                rel_path_start = i
+                break
+
+        # Build the new path with the destination base
+        if rel_path_start > 0:
+            rel_path = '/'.join(path_parts[rel_path_start:])
+            # Check if this is a Cleanup path
+            if path_parts[rel_path_start].lower() == 'cleanup' or any(cleanup_term in rel_path.lower()
+                                                                     for cleanup_term in ['duplicates', 'temporary', 'logs', 'unknown']):
+                return f"{dest_base}/{rel_path}"
+            else:
+                # Default to Organized path
+                return f"{dest_base}/{rel_path}"
+        else:
+            # Fallback - determine if this is likely a Cleanup or Organized path
+            path_lower = old_path.lower()
+            if any(cleanup_term in path_lower for cleanup_term in ['cleanup', 'duplicates', 'temporary', 'logs', 'unknown']):
+                # This looks like a Cleanup path
+                return f"{dest_base}/Cleanup/{os.path.basename(old_path)}"
+            else:
+                # Default to Organized/Other
+                return f"{dest_base}/Organized/Other/{os.path.basename(old_path)}"
+
+
+def move_destinations(config):
+    return [action['move']['dest'] if isinstance(action['move'], dict) else action['move']
+            for rule in config['rules'] for action in rule.get('actions', [])
+            if isinstance(action, dict) and 'move' in action]
+
+
+@pytest.mark.parametrize('dest_base', ['/new/base', '/mnt/nas/Sorted/'])
+def test_index_rewrites_the_shipped_config_like_update_path(dest_base):
+    destinations = move_destinations(load_yaml(SHIPPED_CONFIG))
+    index = customize_config.DestinationIndex(dest_base)
+    base = dest_base.rstrip('/')
+    organized_paths = legacy_organized_paths(base)
+
+    assert destinations
+    for dest in destinations:
+        assert index.rewrite(dest) == legacy_update_path(dest, base, organized_paths), dest
+
+
+@pytest.mark.parametrize('old_path, new_path', [
+    # Deep destinations keep the sub folders and templates below the known folder
+    ('/old/Organized/Media/Images/Photos/{created.year}/{created.month}/',
+     '/new/base/Organized/Media/Images/Photos/{created.year}/{created.month}/'),
+    ('/old/Organized/Development/Data/Database/backups/',
+     '/new/base/Organized/Development/Data/Database/backups/'),
+    ('/old/Cleanup/Logs/{extension}/{name}.log', '/new/base/Cleanup/Logs/{extension}/{name}.log'),
+    ('/old/organized/media/images/RAW/', '/new/base/Organized/Media/Images/Raw/'),
+    # Without an Organized/ or Cleanup/ component the first known folder anchors the path
+    ('~/Sorted/Documents/Text/', '/new/base/Organized/Documents/Text/'),
+    ('~/Sorted/Duplicates/Music/', '/new/base/Cleanup/Duplicates/Music/'),
+    ('/srv/temporary/stuff/', '/new/base/Cleanup/Temporary/stuff/'),
+    ('/srv/misc/notes.txt', '/new/base/Organized/Other/notes.txt'),
+])
+def test_index_rewrites_deep_and_unanchored_paths(old_path, new_path):
+    assert customize_config.DestinationIndex('/new/base/').rewrite(old_path) == new_path
+
+
+@pytest.mark.parametrize('layout_dest', [
+    '/old/base/Organized/Media/Images/Photos',
+    '/old/base/Organized/Media/Images/Photos/',
+    '/old/base/organized/media/images/photos',
+])
+def test_layouts_move_with_their_destination_directory(layout_dest):
+    config = {
+        'rules': [{'actions': [{'move': {'dest': '/old/base/Organized/Media/Images/Photos/'}}]}],
+        'layout': [{'dest': layout_dest, 'fanout': 'date'}],
+    }
+    customize_config.update_destination_base(config, '/new/base')
+
+    assert config['rules'][0]['actions'][0]['move']['dest'] == '/new/base/Organized/Media/Images/Photos/'
+    assert config['layout'][0]['dest'] == '/new/base/Organized/Media/Images/Photos/'
+
+
+def test_layout_without_a_rule_is_rewritten_as_a_directory():
+    config = {'rules': [], 'layout': [{'dest': '/old/base/Organized/Documents/PDF', 'fanout': 'hash'}]}
+    customize_config.update_destination_base(config, '/new/base')
+
+    assert config['layout'][0]['dest'] == '/new/base/Organized/Documents/PDF/'
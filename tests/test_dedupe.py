@@ -0,0 +1,127 @@
+import json
+import os
+
+import dedupe
+from io_scheduler import IOScheduler
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def read_manifest(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def link_entry(path, original, method, data):
+    st = os.stat(path)
+    return {
+        'type': 'link', 'path': str(path), 'original': str(original), 'method': method,
+        'sha256': dedupe.hashlib.sha256(data).hexdigest(), 'size': len(data),
+        'mode': st.st_mode, 'mtime_ns': st.st_mtime_ns,
+    }
+
+
+def write_manifest(path, entries):
+    with open(path, 'w') as file:
+        for entry in entries:
+            file.write(json.dumps(entry) + '\n')
+
+
+def test_hardlink_round_trip(tmp_path):
+    data = os.urandom(10000)
+    original = write(tmp_path / 'files' / 'a.bin', data)
+    duplicate = write(tmp_path / 'files' / 'x' / 'b.bin', data)
+    os.utime(original, (1, 1))
+    manifest = tmp_path / 'manifest.jsonl'
+
+    stats = dedupe.deduplicate([str(tmp_path / 'files')], mode='hardlink', manifest_path=str(manifest))
+    assert stats['hardlink'] == 1
+    assert os.stat(duplicate).st_ino == os.stat(original).st_ino
+
+    stats = dedupe.undo(str(manifest))
+    assert stats['restored'] == 1
+    assert os.stat(duplicate).st_ino != os.stat(original).st_ino
+    assert duplicate.read_bytes() == data
+
+
+def test_manifest_paths_are_absolute(tmp_path, monkeypatch):
+    data = os.urandom(10000)
+    write(tmp_path / 'd' / 'a.bin', data)
+    write(tmp_path / 'd' / 'x' / 'b.bin', data)
+    monkeypatch.chdir(tmp_path)
+    dedupe.deduplicate(['d'], mode='hardlink', manifest_path='m.jsonl')
+
+    link = [entry for entry in read_manifest(tmp_path / 'm.jsonl') if entry['type'] == 'link'][0]
+    assert os.path.isabs(link['path']) and os.path.isabs(link['original'])
+
+    monkeypatch.chdir(tmp_path / 'd')
+    assert dedupe.undo(str(tmp_path / 'm.jsonl'))['restored'] == 1
+
+
+def test_undo_reflink_keeps_duplicate_bytes_when_original_changed(tmp_path):
+    # A reflink is an independent copy-on-write file: editing the original must
+    # not leak into the duplicate on undo
+    data = os.urandom(10000)
+    original = write(tmp_path / 'a.bin', data)
+    duplicate = write(tmp_path / 'b.bin', data)
+    manifest = tmp_path / 'manifest.jsonl'
+    write_manifest(manifest, [link_entry(duplicate, original, 'reflink', data)])
+    original.write_bytes(os.urandom(10000))
+
+    assert dedupe.undo(str(manifest))['restored'] == 1
+    assert duplicate.read_bytes() == data
+
+
+def test_undo_without_original(tmp_path):
+    data = os.urandom(10000)
+    original = write(tmp_path / 'a.bin', data)
+    duplicate = tmp_path / 'b.bin'
+    os.link(original, duplicate)
+    manifest = tmp_path / 'manifest.jsonl'
+    write_manifest(manifest, [link_entry(duplicate, original, 'hardlink', data)])
+    # Organized away after deduplication; the inode is still shared
+    moved = tmp_path / 'Organized' / 'a.bin'
+    moved.parent.mkdir()
+    original.rename(moved)
+
+    assert dedupe.undo(str(manifest))['restored'] == 1
+    assert os.stat(duplicate).st_ino != os.stat(moved).st_ino
+    assert duplicate.read_bytes() == data
+
+
+def test_undo_skips_changed_content(tmp_path):
+    data = os.urandom(10000)
+    original = write(tmp_path / 'a.bin', data)
+    duplicate = tmp_path / 'b.bin'
+    os.link(original, duplicate)
+    manifest = tmp_path / 'manifest.jsonl'
+    write_manifest(manifest, [link_entry(duplicate, original, 'hardlink', data)])
+    # Editing a hardlinked original edits the duplicate too; there is nothing left to restore
+    changed = os.urandom(10000)
+    with open(original, 'r+b') as file:
+        file.write(changed)
+
+    stats = dedupe.undo(str(manifest))
+    assert stats == {'restored': 0, 'skipped': 1, 'error': 0}
+    assert duplicate.read_bytes() == changed
+    assert not [name for name in os.listdir(tmp_path) if '.dedupe-' in name]
+
+
+def test_find_duplicates_skips_vanished_files(tmp_path, monkeypatch):
+    data = os.urandom(10000)
+    paths = [str(write(tmp_path / f'{name}.bin', data)) for name in 'abc']
+    hash_groups = dedupe.hash_groups
+
+    def hash_then_remove(groups, hash_func, scheduler):
+        result = hash_groups(groups, hash_func, scheduler)
+        if hash_func is dedupe.full_hash and os.path.exists(paths[0]):
+            os.remove(paths[0])
+        return result
+
+    monkeypatch.setattr(dedupe, 'hash_groups', hash_then_remove)
+    duplicates = dedupe.find_duplicates([(path, len(data)) for path in paths], IOScheduler())
+    assert [(original, dups) for _, original, dups in duplicates] == [(paths[1], [paths[2]])]
@@ -0,0 +1,102 @@
+import types
+
+import pytest
+
+import io_scheduler
+from io_scheduler import AIMD_WINDOW, IOScheduler, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake clock for io_scheduler; sleeping advances it and is recorded"""
+    clock = types.SimpleNamespace(now=1000.0, sleeps=[])
+
+    def sleep(seconds):
+        clock.sleeps.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(io_scheduler, 'time', types.SimpleNamespace(monotonic=lambda: clock.now, sleep=sleep))
+    return clock
+
+
+def run_window(scheduler, latency, count=AIMD_WINDOW):
+    for _ in range(count):
+        scheduler.acquire()
+        scheduler.release(latency)
+
+
+def test_token_bucket_allows_a_one_second_burst(clock):
+    bucket = TokenBucket(100)
+    for _ in range(100):
+        bucket.consume(1)
+    assert clock.sleeps == []
+
+    bucket.consume(50)
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_token_bucket_debt_is_slept_off_at_the_rate(clock):
+    bucket = TokenBucket(1000)
+    bucket.consume(3000)
+    # One second of burst, the remaining 2000 tokens take two seconds
+    assert clock.sleeps == [pytest.approx(2.0)]
+
+    # The sleep paid the debt off, nothing is left for the next consumer
+    bucket.consume(500)
+    assert clock.sleeps[1:] == [pytest.approx(0.5)]
+
+
+def test_token_bucket_does_not_save_up_more_than_the_burst(clock):
+    bucket = TokenBucket(10)
+    clock.now += 60
+    bucket.consume(15)
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_byte_budget_uses_size_suffixes(clock):
+    scheduler = IOScheduler(max_bytes_per_sec='1M')
+    scheduler.call(len, b'', nbytes=3 * 1024 ** 2)
+    assert clock.sleeps == [pytest.approx(2.0)]
+
+
+def test_aimd_increases_the_limit_by_one_per_window_on_target():
+    scheduler = IOScheduler(target_latency_ms=50, max_workers=4, min_workers=1)
+    assert scheduler.limit == 1
+
+    run_window(scheduler, 0.01, AIMD_WINDOW - 1)
+    assert scheduler.limit == 1
+    run_window(scheduler, 0.01, 1)
+    assert scheduler.limit == 2
+
+    run_window(scheduler, 0.01)
+    run_window(scheduler, 0.01)
+    run_window(scheduler, 0.01)
+    assert scheduler.limit == 4
+    assert scheduler.stats['increases'] == 3 and scheduler.stats['peak_limit'] == 4
+
+
+def test_aimd_ignores_latency_outliers_above_the_p95():
+    scheduler = IOScheduler(target_latency_ms=50, max_workers=4)
+    run_window(scheduler, 0.01, AIMD_WINDOW - 1)
+    run_window(scheduler, 5.0, 1)
+    assert scheduler.limit == 2 and scheduler.stats['decreases'] == 0
+
+
+def test_aimd_halves_the_limit_down_to_min_workers():
+    scheduler = IOScheduler(target_latency_ms=50, max_workers=8, min_workers=1)
+    for _ in range(7):
+        run_window(scheduler, 0.01)
+    assert scheduler.limit == 8
+
+    limits = []
+    for _ in range(4):
+        run_window(scheduler, 0.2)
+        limits.append(scheduler.limit)
+    assert limits == [4, 2, 1, 1]
+    assert scheduler.stats['decreases'] == 3 and scheduler.stats['peak_limit'] == 8
+
+
+def test_without_a_target_latency_the_limit_stays_at_max_workers():
+    scheduler = IOScheduler(max_workers=3)
+    run_window(scheduler, 10.0)
+    assert scheduler.limit == 3 and scheduler.latencies == []
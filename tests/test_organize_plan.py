@@ -0,0 +1,176 @@
+import os
+import textwrap
+
+import pytest
+
+import organize_plan
+
+pytest.importorskip('organize')
+
+
+def write_config(tmp_path, text):
+    path = tmp_path / 'organize.yaml'
+    path.write_text(textwrap.dedent(text).format(tmp=tmp_path))
+    return path
+
+
+def make_files(directory, names, data='x'):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (directory / name).write_text(f"{data} {name}")
+
+
+def record(config, tmp_path):
+    plan = tmp_path / 'plan.jsonl'
+    organize_plan.record_plan(config, plan)
+    return plan
+
+
+def test_record_and_apply_with_drift_and_chains(tmp_path):
+    make_files(tmp_path / 'src', ['a.txt', 'b.txt', 'c.txt', 'n.log'])
+    config = write_config(tmp_path, """
+        rules:
+          - name: Logs
+            locations: {tmp}/src
+            filters:
+              - extension: log
+            actions:
+              - rename: "{{path.stem}}.old"
+              - copy:
+                  dest: {tmp}/out/Logs/
+          - name: Text
+            locations: {tmp}/src
+            filters:
+              - extension: txt
+            actions:
+              - move:
+                  dest: {tmp}/out/Text/
+        """)
+    plan = record(config, tmp_path)
+    # Nothing is touched while recording
+    assert sorted(os.listdir(tmp_path / 'src')) == ['a.txt', 'b.txt', 'c.txt', 'n.log']
+
+    (tmp_path / 'src' / 'b.txt').write_text('changed after recording')
+    stats = organize_plan.apply_plan(plan)
+
+    assert stats['applied'] == 4
+    assert stats['drifted'] == 1
+    assert stats['error'] == 0
+    assert sorted(os.listdir(tmp_path / 'out' / 'Text')) == ['a.txt', 'c.txt']
+    assert sorted(os.listdir(tmp_path / 'src')) == ['b.txt', 'n.old']
+    # The copy followed the file to its new name
+    assert os.listdir(tmp_path / 'out' / 'Logs') == ['n.old']
+
+
+def test_dry_run_changes_nothing(tmp_path):
+    make_files(tmp_path / 'src', ['a.txt'])
+    config = write_config(tmp_path, """
+        rules:
+          - locations: {tmp}/src
+            filters:
+              - extension: txt
+            actions:
+              - move:
+                  dest: {tmp}/out/
+        """)
+    stats = organize_plan.apply_plan(record(config, tmp_path), dry_run=True)
+    assert stats['applied'] == 1
+    assert os.listdir(tmp_path / 'src') == ['a.txt']
+    assert not (tmp_path / 'out').exists()
+
+
+@pytest.mark.parametrize('mode, expected', [
+    ('rename_new', {'a.txt': 'old', 'a 2.txt': 'new'}),
+    ('overwrite', {'a.txt': 'new'}),
+    ('skip', {'a.txt': 'old'}),
+    ('rename_existing', {'a 2.txt': 'old', 'a.txt': 'new'}),
+])
+def test_on_conflict_is_honoured(tmp_path, mode, expected):
+    make_files(tmp_path / 'src', ['a.txt'], data='new')
+    config = write_config(tmp_path, """
+        rules:
+          - locations: {tmp}/src
+            filters:
+              - extension: txt
+            actions:
+              - move:
+                  dest: {tmp}/out/
+                  on_conflict: %s
+        """ % mode)
+    plan = record(config, tmp_path)
+    # The conflict only appears after recording
+    make_files(tmp_path / 'out', ['a.txt'], data='old')
+
+    organize_plan.apply_plan(plan)
+    result = {name: (tmp_path / 'out' / name).read_text().split()[0] for name in os.listdir(tmp_path / 'out')}
+    assert result == expected
+
+
+def test_record_refuses_actions_a_plan_cannot_reproduce(tmp_path):
+    make_files(tmp_path / 'src', ['a.txt'])
+    config = write_config(tmp_path, """
+        rules:
+          - name: Links
+            locations: {tmp}/src
+            filters:
+              - extension: txt
+            actions:
+              - symlink: {tmp}/links/
+          - name: Trash conflicts
+            locations: {tmp}/src
+            actions:
+              - move:
+                  dest: {tmp}/out/
+                  on_conflict: trash
+        """)
+    with pytest.raises(ValueError) as error:
+        record(config, tmp_path)
+    assert "unsupported action 'symlink'" in str(error.value)
+    assert "unsupported on_conflict 'trash'" in str(error.value)
+    assert not (tmp_path / 'plan.jsonl').exists()
+
+
+@pytest.mark.parametrize('continue_with, src, backup', [
+    ('copy', ['a.txt'], ['a.bak']),
+    ('original', ['a.bak'], ['a.txt']),
+])
+def test_actions_after_a_copy_follow_continue_with(tmp_path, continue_with, src, backup):
+    make_files(tmp_path / 'src', ['a.txt'])
+    config = write_config(tmp_path, """
+        rules:
+          - locations: {tmp}/src
+            filters:
+              - extension: txt
+            actions:
+              - copy:
+                  dest: {tmp}/backup/
+                  continue_with: %s
+              - rename: "{{path.stem}}.bak"
+        """ % continue_with)
+    stats = organize_plan.apply_plan(record(config, tmp_path))
+
+    assert stats['applied'] == 2 and stats['error'] == 0
+    assert os.listdir(tmp_path / 'src') == src
+    assert os.listdir(tmp_path / 'backup') == backup
+
+
+def test_later_actions_follow_a_destination_renamed_on_conflict(tmp_path):
+    make_files(tmp_path / 'src', ['a.txt'], data='new')
+    config = write_config(tmp_path, """
+        rules:
+          - locations: {tmp}/src
+            filters:
+              - extension: txt
+            actions:
+              - move:
+                  dest: {tmp}/out/
+              - rename: "{{path.stem}}-done.txt"
+        """)
+    plan = record(config, tmp_path)
+    # The move lands on "a 2.txt"; the rename must act on that file, not on a.txt
+    make_files(tmp_path / 'out', ['a.txt'], data='old')
+
+    stats = organize_plan.apply_plan(plan)
+    assert stats['applied'] == 2 and stats['error'] == 0
+    result = {name: (tmp_path / 'out' / name).read_text().split()[0] for name in os.listdir(tmp_path / 'out')}
+    assert result == {'a.txt': 'old', 'a-done.txt': 'new'}
@@ -0,0 +1,173 @@
+import json
+import os
+import tarfile
+import time
+
+import pytest
+
+import organize_plan
+
+
+def write_plan(tmp_path, entries, **header):
+    path = tmp_path / 'plan.jsonl'
+    with open(path, 'w') as file:
+        file.write(json.dumps(dict({'type': 'plan', 'version': organize_plan.PLAN_VERSION}, **header)) + '\n')
+        for entry in entries:
+            file.write(json.dumps(entry) + '\n')
+    return path
+
+
+def move_entry(source, dest_dir, basedir, rule='Rule'):
+    st = os.stat(source)
+    return {
+        'type': 'action', 'rule_nr': 0, 'rule': rule, 'action': 'move', 'source': str(source),
+        'basedir': str(basedir), 'dest': str(dest_dir / source.name),
+        'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+    }
+
+
+def make_sources(tmp_path, folders, name='same.txt'):
+    sources = []
+    for folder in range(folders):
+        source = tmp_path / 'src' / f'dir{folder}' / name
+        source.parent.mkdir(parents=True)
+        source.write_text(f'file {folder}')
+        sources.append(source)
+    return sources
+
+
+def test_overwrite_waits_for_the_action_writing_the_same_destination(tmp_path, monkeypatch):
+    sources = make_sources(tmp_path, 16)
+    dest = tmp_path / 'out'
+    entries = [dict(move_entry(source, dest, source.parent), on_conflict='overwrite') for source in sources]
+    plan = write_plan(tmp_path, entries, io={'max_workers': 8})
+
+    writing, overlaps = set(), []
+    execute_action = organize_plan.execute_action
+
+    def tracked(action, source, dest):
+        if dest in writing:
+            overlaps.append(dest)
+        writing.add(dest)
+        time.sleep(0.01)
+        try:
+            return execute_action(action, source, dest)
+        finally:
+            writing.discard(dest)
+
+    monkeypatch.setattr(organize_plan, 'execute_action', tracked)
+    stats = organize_plan.apply_plan(plan)
+
+    assert stats['applied'] == 16 and stats['error'] == 0
+    assert overlaps == []
+    assert os.listdir(dest) == ['same.txt']
+    assert not any(source.exists() for source in sources)
+
+
+@pytest.fixture
+def fake_devices(monkeypatch):
+    """Pretend that src and out are separate devices and count the lookups"""
+    lookups = []
+
+    def device_of(path):
+        lookups.append(str(path))
+        return 2 if '/out' in str(path) else 1
+
+    monkeypatch.setattr(organize_plan, 'device_of', device_of)
+    return lookups
+
+
+def test_rename_new_reserves_names_across_concurrent_chains(tmp_path):
+    sources = make_sources(tmp_path, 40)
+    dest = tmp_path / 'out'
+    plan = write_plan(tmp_path, [move_entry(source, dest, source.parent) for source in sources],
+                      io={'max_workers': 8})
+
+    stats = organize_plan.apply_plan(plan)
+
+    assert stats['applied'] == 40 and stats['error'] == 0
+    names = os.listdir(dest)
+    assert len(names) == 40
+    assert 'same.txt' in names and 'same 40.txt' in names
+    assert sorted((dest / name).read_text() for name in names) == sorted(f'file {n}' for n in range(40))
+
+
+def test_devices_are_looked_up_per_location_not_per_file(tmp_path, fake_devices):
+    location = tmp_path / 'src'
+    location.mkdir()
+    sources = []
+    for n in range(100):
+        source = location / f'{n}.txt'
+        source.write_text(str(n))
+        sources.append(source)
+    plan = write_plan(tmp_path, [move_entry(source, tmp_path / 'out', location) for source in sources])
+
+    assert organize_plan.apply_plan(plan)['applied'] == 100
+    assert sorted(set(fake_devices)) == sorted([str(location), str(tmp_path / 'out')])
+    assert len(fake_devices) == 2
+
+
+@pytest.fixture
+def schedulers(monkeypatch):
+    """The {device: scheduler} of the last apply_plan() call"""
+    result = {}
+    run = organize_plan.PlanExecutor.run
+
+    def recording_run(self, entries):
+        result.update(run(self, entries))
+        return result
+
+    monkeypatch.setattr(organize_plan.PlanExecutor, 'run', recording_run)
+    return result
+
+
+def test_cross_device_moves_count_against_the_destination(tmp_path, fake_devices, schedulers):
+    sources = make_sources(tmp_path, 5)
+    plan = write_plan(tmp_path, [move_entry(source, tmp_path / 'out', source.parent) for source in sources])
+
+    organize_plan.apply_plan(plan)
+
+    size = sum(len(f'file {n}') for n in range(5))
+    assert {device: (s.stats['ops'], s.stats['bytes']) for device, s in schedulers.items()} == {
+        1: (5, size), 2: (5, size)}
+
+
+def test_compaction_runs_through_the_device_schedulers(tmp_path, fake_devices, schedulers):
+    sources = make_sources(tmp_path, 6, name='x.log')
+    plan = write_plan(tmp_path, [move_entry(source, tmp_path / 'out', source.parent, rule='Logs')
+                                 for source in sources],
+                      compact=[{'rule': 'Logs'}])
+
+    stats = organize_plan.apply_plan(plan)
+
+    assert stats['compacted'] == 6 and stats['error'] == 0
+    archives = [name for name in os.listdir(tmp_path / 'out') if name.endswith('.tar.gz')]
+    assert len(archives) == 1
+    with tarfile.open(tmp_path / 'out' / archives[0]) as tar:
+        # Six x.log files from six locations: each keeps a member of its own
+        assert len(set(tar.getnames())) == 6
+    assert not any(source.exists() for source in sources)
+    assert {device: s.stats['ops'] for device, s in schedulers.items()} == {1: 6, 2: 6}
+
+
+def test_compacted_rules_sharing_a_destination(tmp_path):
+    location = tmp_path / 'src'
+    location.mkdir()
+    entries = []
+    for n in range(20):
+        for extension, rule in (('log', 'Identify Log Files'), ('tmp', 'Identify Temporary Files')):
+            source = location / f'{n}.{extension}'
+            source.write_text(f'{rule} {n}')
+            entries.append(move_entry(source, tmp_path / 'Organized' / 'Other', location, rule=rule))
+    plan = write_plan(tmp_path, entries, compact=[{'rule': 'Identify Log Files'},
+                                                  {'rule': 'Identify Temporary Files'}])
+
+    stats = organize_plan.apply_plan(plan)
+
+    assert stats['compacted'] == 40 and stats['error'] == 0
+    members = []
+    for archive in (tmp_path / 'Organized' / 'Other').glob('*.tar.gz'):
+        with tarfile.open(archive) as tar:
+            members.extend(tar.getnames())
+    assert len(members) == 40 and len(set(members)) == 40
+    assert not os.listdir(location)